@@ -5,6 +5,9 @@ from fastapi import Depends, HTTPException, status
 from pydantic import ValidationError
 from jose import JWTError, jwt
 from app.core.connections.sql import sqlalchemy_engine
+from app.core.connections.replica import ReplicaRouter, RoutingSession, replica_engines
+from sqlalchemy.exc import OperationalError
+from app.core.managers.user import UserCache
 from app.core.config import config
 from app.models.user import User
 from app.models.security import TokenPayload
@@ -20,33 +23,59 @@ async def get_session() -> Generator[Session, None, None]:
         yield session
 
 
+async def get_routing_session() -> Generator[Session, None, None]:
+    with RoutingSession() as session:
+        try:
+            yield session
+        except OperationalError:
+            if not session.use_primary:
+                ReplicaRouter.mark_unhealthy(session.replica_engine)
+            raise
+
+
+# Without replicas, reads share the request's primary session
+get_read_session = get_routing_session if replica_engines else get_session
+
 TokenDep = Annotated[str, Depends(oauth2_scheme)]
 SessionDep = Annotated[Session, Depends(get_session)]
+ReadSessionDep = Annotated[Session, Depends(get_read_session)]
 LoginDep = Annotated[OAuth2PasswordRequestForm, Depends()]
 
 
-async def get_current_user(session: SessionDep, token: TokenDep) -> User:
-    try:
-        payload = jwt.decode(
-            token, config.jwt_secret, algorithms=[config.jwt_algorithm]
-        )
-        token_data = TokenPayload(**payload)
-    except (JWTError, ValidationError):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials: Invalid token",
-        )
+async def get_current_user(session: ReadSessionDep, token: TokenDep) -> User:
+    token_data = UserCache.get_token(token)
+    if token_data is None:
+        try:
+            payload = jwt.decode(
+                token, config.jwt_secret, algorithms=[config.jwt_algorithm]
+            )
+            token_data = TokenPayload(**payload)
+        except (JWTError, ValidationError):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials: Invalid token",
+            )
+        if "exp" in payload:
+            UserCache.set_token(token, token_data, payload["exp"])
     if token_data.refresh:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Could not validate credentials: Access token required",
         )
+    user = UserCache.get_user(token_data.sub)
+    if user is not None:
+        return user
+    version = UserCache.get_version(token_data.sub)
+    if isinstance(session, RoutingSession):
+        # A lagging replica could return a row older than the last invalidation
+        session.stick_to_primary()
     user = session.get(User, token_data.sub)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials: User not found",
         )
+    UserCache.set_user(user, version)
     return user
 
 
@@ -15,9 +15,11 @@ class ExceptionResponse(ExceptionDetail):
         },
         403: {"model": ExceptionDetail, "description": "Insufficient permissions"},
         404: {"model": ExceptionDetail, "description": "Not found"},
+        413: {"model": ExceptionDetail, "description": "Payload too large"},
         422: {"model": ExceptionDetail, "description": "Unprocessable entity"},
         500: {"model": ExceptionDetail, "description": "Internal server error"},
         501: {"model": ExceptionDetail, "description": "Not implemented"},
+        503: {"model": ExceptionDetail, "description": "Service unavailable"},
     }
 
     @staticmethod
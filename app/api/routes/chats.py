@@ -1,13 +1,19 @@
-from fastapi import APIRouter, HTTPException, status
-from app.models.chat import Chat, ChatCreate, ChatRead, ChatVisibility
+from fastapi import APIRouter, HTTPException, Response, UploadFile, status
+from app.models.chat import Chat, ChatCreate, ChatRead, ChatVisibility, ChatImage
+from app.models.message import Message, MessageRole, MessageType
 from app.models.preset import Preset
 from app.models.server import ServerMessage
 from app.models.order import OrderBy, Order
-from app.api.deps import SessionDep, UserDep
+from app.api.deps import SessionDep, ReadSessionDep, UserDep
 from app.api.resps import ExceptionResponse
 from app.core.managers.message import MessageStorage
-from sqlmodel import select, asc, desc
+from app.core.managers.search import SearchManager
+from app.core.managers.static import StaticFilesManager
+from app.core.pagination import apply_keyset, get_next_cursor
+from sqlmodel import select
+from typing import Optional
 from datetime import datetime
+from uuid import UUID
 
 router = APIRouter()
 
@@ -15,36 +21,81 @@ router = APIRouter()
 @router.get(
     "",
     response_model=list[ChatRead],
-    responses=ExceptionResponse.get_responses(401, 403),
+    responses=ExceptionResponse.get_responses(400, 401, 403),
 )
 async def list_chats(
-    session: SessionDep,
+    session: ReadSessionDep,
     user: UserDep,
+    response: Response,
     offset: int = 0,
     limit: int = 10,
     order_by: OrderBy = OrderBy.CREATE_TIME,
     order: Order = Order.DESC,
+    cursor: Optional[str] = None,
 ):
-    order_expr = (
-        asc(getattr(Chat, order_by.value))
-        if order == Order.ASC
-        else desc(getattr(Chat, order_by.value))
+    statement = apply_keyset(
+        select(Chat).where(Chat.owner_id == user.id), Chat, order_by, order, cursor
     )
+    chats = session.exec(statement.offset(offset).limit(limit)).all()
+
+    next_cursor = get_next_cursor(chats, order_by, order, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        {
+            **chat.model_dump(),
+            "messages": MessageStorage.get_messages(chat.id),
+        }
+        for chat in chats
+    ]
+
+
+@router.get(
+    "/search",
+    response_model=list[ChatRead],
+    responses=ExceptionResponse.get_responses(400, 401),
+)
+async def search_chats(
+    session: ReadSessionDep,
+    user: UserDep,
+    response: Response,
+    q: str,
+    offset: int = 0,
+    limit: int = 10,
+    order_by: OrderBy = OrderBy.CREATE_TIME,
+    order: Order = Order.DESC,
+    cursor: Optional[str] = None,
+):
+    def fetch(chat_ids: list[UUID], limit: int) -> list[Chat]:
+        statement = apply_keyset(
+            select(Chat).where(Chat.owner_id == user.id, Chat.id.in_(chat_ids)),
+            Chat,
+            order_by,
+            order,
+            cursor,
+        )
+        return session.exec(statement.limit(limit)).all()
 
-    chats = session.exec(
-        select(Chat)
-        .where(Chat.owner_id == user.id)
-        .order_by(order_expr)
-        .offset(offset)
-        .limit(limit)
+    chats = SearchManager.paginate(
+        SearchManager.search_chats(user.id, q),
+        fetch,
+        Chat,
+        order_by,
+        order,
+        offset,
+        limit,
+        cursor,
     )
 
+    next_cursor = get_next_cursor(chats, order_by, order, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
     return [
         {
             **chat.model_dump(),
             "messages": MessageStorage.get_messages(chat.id),
         }
-        for chat in chats.all()
+        for chat in chats
     ]
 
 
@@ -63,6 +114,7 @@ async def create_chat(session: SessionDep, user: UserDep, chat: ChatCreate):
     session.commit()
     session.refresh(db_chat)
     MessageStorage.set_messages(db_chat.id, chat.messages)
+    SearchManager.index_chat(db_chat)
     return {
         **db_chat.model_dump(),
         "messages": MessageStorage.get_messages(db_chat.id),
@@ -93,6 +145,7 @@ async def read_chat(chat_id: str, session: SessionDep, user: UserDep):
         session.commit()
         session.refresh(new_chat)
         MessageStorage.copy_messages(chat_id, new_chat.id)
+        SearchManager.index_chat(new_chat)
         return {
             **new_chat.model_dump(),
             "messages": MessageStorage.get_messages(new_chat.id),
@@ -131,12 +184,41 @@ async def update_chat(
     session.commit()
     session.refresh(db_chat)
     MessageStorage.set_messages(db_chat.id, chat.messages)
+    SearchManager.index_chat(db_chat)
     return {
         **db_chat.model_dump(),
         "messages": MessageStorage.get_messages(db_chat.id),
     }
 
 
+@router.post(
+    "/{chat_id}/images",
+    response_model=ChatImage,
+    responses=ExceptionResponse.get_responses(400, 401, 403, 404, 413),
+)
+async def upload_chat_image(
+    chat_id: str, image_file: UploadFile, session: SessionDep, user: UserDep
+):
+    db_chat = session.get(Chat, chat_id)
+    if db_chat is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Chat not found"
+        )
+    if db_chat.owner_id != user.id and user.permission < 2:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Insufficient permissions: You cannot update other user's chat",
+        )
+    url, preview_url = await StaticFilesManager.save_image_file(image_file)
+    # Only the content-addressed URL goes into the message history
+    message = Message(role=MessageRole.user, type=MessageType.image, content=url)
+    MessageStorage.add_message(db_chat.id, message)
+    db_chat.update_time = datetime.now()
+    session.add(db_chat)
+    session.commit()
+    return {"url": url, "preview_url": preview_url, "message": message}
+
+
 @router.delete(
     "/{chat_id}",
     response_model=ServerMessage,
@@ -156,4 +238,5 @@ async def delete_chat(chat_id: str, session: SessionDep, user: UserDep):
     session.delete(chat)
     session.commit()
     MessageStorage.delete_messages(chat_id)
+    SearchManager.remove_chat(chat_id)
     return {"message": "Chat deleted successfully"}
@@ -1,9 +1,16 @@
 from app.core.managers.redeem import RedeemManager
 from app.api.deps import AdminDep, SessionDep
 from app.api.resps import ExceptionResponse
-from app.models.credit import RedeemCode
+from app.models.credit import (
+    RedeemCode,
+    RedeemCodeBatch,
+    RedeemCodeBatchCreate,
+    RedeemCodeBatchImport,
+    RedeemCodeBatchRead,
+)
 from app.models.server import ServerMessage
 from fastapi import APIRouter
+import asyncio
 
 router = APIRouter()
 
@@ -17,10 +24,14 @@ async def read_redeem_code(_user: SessionDep, code: str):
 
 
 @router.post(
-    "", response_model=RedeemCode, responses=ExceptionResponse.get_responses(401, 403)
+    "",
+    response_model=RedeemCode,
+    responses=ExceptionResponse.get_responses(400, 401, 403),
 )
 async def create_redeem_code(_admin: AdminDep, redeem_code: RedeemCode):
-    RedeemManager.add_redeem_code(redeem_code.redeem_code, redeem_code.value)
+    RedeemManager.add_redeem_code(
+        redeem_code.redeem_code, redeem_code.value, redeem_code.expire_seconds
+    )
     return redeem_code
 
 
@@ -32,3 +43,52 @@ async def create_redeem_code(_admin: AdminDep, redeem_code: RedeemCode):
 async def delete_redeem_code(_admin: AdminDep, code: str):
     RedeemManager.delete_redeem_code(code)
     return {"message": f"Redeem code {code} deleted successfully"}
+
+
+@router.post(
+    "/batches",
+    response_model=RedeemCodeBatchRead,
+    responses=ExceptionResponse.get_responses(401, 403),
+)
+async def create_redeem_code_batch(_admin: AdminDep, batch: RedeemCodeBatchCreate):
+    # Large batches take seconds to generate and write, keep them off the event loop
+    codes = await asyncio.to_thread(
+        RedeemManager.generate_redeem_codes, batch.count, batch.length
+    )
+    redeem_code_batch = await asyncio.to_thread(
+        RedeemManager.add_redeem_code_batch, codes, batch.value, batch.expire_seconds
+    )
+    return {**redeem_code_batch.model_dump(), "redeem_codes": codes}
+
+
+@router.post(
+    "/batches/import",
+    response_model=RedeemCodeBatch,
+    responses=ExceptionResponse.get_responses(400, 401, 403),
+)
+async def import_redeem_code_batch(_admin: AdminDep, batch: RedeemCodeBatchImport):
+    return await asyncio.to_thread(
+        RedeemManager.add_redeem_code_batch,
+        batch.redeem_codes,
+        batch.value,
+        batch.expire_seconds,
+    )
+
+
+@router.get(
+    "/batches/{batch_id}",
+    response_model=RedeemCodeBatch,
+    responses=ExceptionResponse.get_responses(401, 403, 404),
+)
+async def read_redeem_code_batch(_admin: AdminDep, batch_id: str):
+    return RedeemManager.get_redeem_code_batch(batch_id)
+
+
+@router.delete(
+    "/batches/{batch_id}",
+    response_model=ServerMessage,
+    responses=ExceptionResponse.get_responses(401, 403, 404),
+)
+async def delete_redeem_code_batch(_admin: AdminDep, batch_id: str):
+    RedeemManager.delete_redeem_code_batch(batch_id)
+    return {"message": f"Redeem code batch {batch_id} deleted successfully"}
@@ -1,19 +1,24 @@
 from fastapi import APIRouter, HTTPException, status, UploadFile
 from fastapi.responses import RedirectResponse
-from app.models.user import User, UserRead
+from app.models.user import User, UserRead, AvatarSize
 from app.models.security import PasswordUpdate
 from app.models.server import ServerMessage
 from app.models.like import PresetLikeRecord, ChatLikeRecord, LikesRead
 from app.models.preset import Preset
 from app.models.chat import Chat
-from app.api.deps import UserDep, SessionDep
+from app.api.deps import UserDep, SessionDep, ReadSessionDep
 from app.api.resps import ExceptionResponse
-from app.core.security import get_password_hash, verify_password
+from app.core.security import get_password_hash_async, verify_password_async
 from app.core.managers.static import StaticFilesManager
 from app.core.managers.redeem import RedeemManager
-from app.models.credit import CreditRecords, RedeemCredit
-from app.core.config import config
-from sqlmodel import select
+from app.core.managers.like import LikeManager
+from app.core.managers.user import UserCache
+from app.core.pagination import apply_keyset, get_next_cursor
+from app.models.order import OrderBy, Order
+from app.models.credit import CreditRecord, CreditRecords, RedeemCredit
+from sqlmodel import select, update
+from typing import Optional
+from datetime import datetime
 
 router = APIRouter()
 
@@ -26,7 +31,7 @@ async def read_user_me(user: UserDep):
 @router.put(
     "/password",
     response_model=ServerMessage,
-    responses=ExceptionResponse.get_responses(400, 401, 404),
+    responses=ExceptionResponse.get_responses(400, 401, 404, 503),
 )
 async def reset_password(user: UserDep, session: SessionDep, password: PasswordUpdate):
     db_user = session.get(User, user.id)
@@ -40,14 +45,17 @@ async def reset_password(user: UserDep, session: SessionDep, password: PasswordU
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Old password is required",
             )
-        if not verify_password(password.old_password, db_user.password_hash):
+        if not await verify_password_async(
+            password.old_password, db_user.password_hash
+        ):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Old password is incorrect",
             )
-    db_user.password_hash = get_password_hash(password.new_password)
+    db_user.password_hash = await get_password_hash_async(password.new_password)
     session.add(db_user)
     session.commit()
+    UserCache.invalidate(db_user.id)
     return {"message": "Password updated successfully"}
 
 
@@ -56,14 +64,15 @@ async def reset_password(user: UserDep, session: SessionDep, password: PasswordU
     response_class=RedirectResponse,
     responses=ExceptionResponse.get_responses(401),
 )
-async def get_avatar(user: UserDep):
-    return RedirectResponse(f"{config.api_base_url}{user.avatar}")
+async def get_avatar(user: UserDep, size: AvatarSize = AvatarSize.large):
+    avatar_url = await StaticFilesManager.get_avatar_variant(user.avatar, size)
+    return RedirectResponse(StaticFilesManager.get_url(avatar_url))
 
 
 @router.post(
     "/avatar",
     response_model=ServerMessage,
-    responses=ExceptionResponse.get_responses(401, 404),
+    responses=ExceptionResponse.get_responses(400, 401, 404, 413),
 )
 async def set_avatar(user: UserDep, session: SessionDep, avatar_file: UploadFile):
     db_user = session.get(User, user.id)
@@ -71,19 +80,43 @@ async def set_avatar(user: UserDep, session: SessionDep, avatar_file: UploadFile
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-    db_user.avatar = StaticFilesManager.save_avatar_file(await avatar_file.read())
+    db_user.avatar = await StaticFilesManager.save_avatar_file(avatar_file)
     session.add(db_user)
     session.commit()
+    UserCache.invalidate(db_user.id)
     return {"message": "Avatar updated successfully"}
 
 
 @router.get(
     "/credits",
     response_model=CreditRecords,
-    responses=ExceptionResponse.get_responses(401),
+    responses=ExceptionResponse.get_responses(400, 401),
 )
-async def get_credits(user: UserDep):
-    return {"credit_records": user.credit_records, "credits_left": user.credits_left}
+async def get_credits(
+    user: UserDep,
+    session: ReadSessionDep,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+):
+    statement = select(CreditRecord).where(CreditRecord.user_id == user.id)
+    if start_time is not None:
+        statement = statement.where(CreditRecord.create_time >= start_time)
+    if end_time is not None:
+        statement = statement.where(CreditRecord.create_time < end_time)
+    statement = apply_keyset(
+        statement, CreditRecord, OrderBy.CREATE_TIME, Order.DESC, cursor
+    )
+    credit_records = session.exec(statement.limit(limit)).all()
+
+    return {
+        "credit_records": credit_records,
+        "credits_left": user.credits_left,
+        "next_cursor": get_next_cursor(
+            credit_records, OrderBy.CREATE_TIME, Order.DESC, limit
+        ),
+    }
 
 
 @router.post(
@@ -101,9 +134,13 @@ async def redeem_credits(user: UserDep, redeem: RedeemCredit):
     response_model=LikesRead,
     responses=ExceptionResponse.get_responses(401),
 )
-async def read_likes(user: UserDep):
-    preset_ids = [like.preset_id for like in user.liked_presets]
-    chat_ids = [like.chat_id for like in user.liked_chats]
+async def read_likes(user: UserDep, session: ReadSessionDep):
+    preset_ids = session.exec(
+        select(PresetLikeRecord.preset_id).where(PresetLikeRecord.user_id == user.id)
+    ).all()
+    chat_ids = session.exec(
+        select(ChatLikeRecord.chat_id).where(ChatLikeRecord.user_id == user.id)
+    ).all()
     return LikesRead(preset_ids=preset_ids, chat_ids=chat_ids)
 
 
@@ -135,8 +172,14 @@ async def create_like_preset(user: UserDep, session: SessionDep, preset_id: str)
 
     like_record = PresetLikeRecord(user_id=user.id, preset_id=preset_id)
     session.add(like_record)
+    session.execute(
+        update(Preset)
+        .where(Preset.id == preset.id)
+        .values(like_count=Preset.like_count + 1, update_time=Preset.update_time)
+    )
     session.commit()
     session.refresh(like_record)
+    LikeManager.incr_trending(preset.id, 1)
     return like_record
 
 
@@ -159,7 +202,13 @@ async def delete_like_preset(user: UserDep, session: SessionDep, preset_id: str)
         )
 
     session.delete(like_record)
+    session.execute(
+        update(Preset)
+        .where(Preset.id == like_record.preset_id)
+        .values(like_count=Preset.like_count - 1, update_time=Preset.update_time)
+    )
     session.commit()
+    LikeManager.incr_trending(like_record.preset_id, -1)
     return ServerMessage(message="Like deleted successfully")
 
 
@@ -191,6 +240,11 @@ async def create_like_chat(user: UserDep, session: SessionDep, chat_id: str):
 
     like_record = ChatLikeRecord(user_id=user.id, chat_id=chat_id)
     session.add(like_record)
+    session.execute(
+        update(Chat)
+        .where(Chat.id == chat.id)
+        .values(like_count=Chat.like_count + 1, update_time=Chat.update_time)
+    )
     session.commit()
     session.refresh(like_record)
     return like_record
@@ -215,5 +269,10 @@ async def delete_like_chat(user: UserDep, session: SessionDep, chat_id: str):
         )
 
     session.delete(like_record)
+    session.execute(
+        update(Chat)
+        .where(Chat.id == like_record.chat_id)
+        .values(like_count=Chat.like_count - 1, update_time=Chat.update_time)
+    )
     session.commit()
     return ServerMessage(message="Like deleted successfully")
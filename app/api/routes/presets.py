@@ -1,61 +1,176 @@
-from fastapi import APIRouter, HTTPException, status
-from sqlmodel import select, or_, and_, asc, desc
+from fastapi import APIRouter, HTTPException, Response, status
+from sqlmodel import select, or_, and_
 from app.models.preset import (
     Preset,
     PresetCreate,
     PresetRead,
     PresetVisibility,
-    PresetParameters,
 )
 from app.models.server import ServerMessage
 from app.models.order import OrderBy, Order
-from app.api.deps import SessionDep, UserDep
+from app.api.deps import SessionDep, ReadSessionDep, UserDep
 from app.api.resps import ExceptionResponse
 from app.core.managers.message import MessageStorage
+from app.core.managers.like import LikeManager
+from app.core.managers.preset import PresetParametersCache, PresetCatalog
+from app.core.managers.search import SearchManager
+from app.core.pagination import apply_keyset, apply_keyset_to_list, get_next_cursor
+from typing import Optional
+from uuid import UUID
 from datetime import datetime
 
 router = APIRouter()
 
 
 @router.get(
-    "", response_model=list[PresetRead], responses=ExceptionResponse.get_responses(401)
+    "",
+    response_model=list[PresetRead],
+    responses=ExceptionResponse.get_responses(400, 401),
 )
 async def list_presets(
-    session: SessionDep,
+    session: ReadSessionDep,
     user: UserDep,
+    response: Response,
     offset: int = 0,
     limit: int = 10,
     order_by: OrderBy = OrderBy.CREATE_TIME,
     order: Order = Order.DESC,
+    cursor: Optional[str] = None,
 ):
-    order_expr = (
-        asc(getattr(Preset, order_by.value))
-        if order == Order.ASC
-        else desc(getattr(Preset, order_by.value))
-    )
-
-    presets = session.exec(
-        select(Preset)
-        .where(
-            or_(
+    if user.permission >= 2:
+        # Admins also see unlisted presets, which are not in the catalog
+        statement = apply_keyset(
+            select(Preset).where(
+                or_(
+                    Preset.owner_id == user.id,
+                    Preset.visibility == PresetVisibility.public,
+                    Preset.visibility == PresetVisibility.unlisted,
+                )
+            ),
+            Preset,
+            order_by,
+            order,
+            cursor,
+        )
+        presets = session.exec(statement.offset(offset).limit(limit)).all()
+        next_cursor = get_next_cursor(presets, order_by, order, limit)
+        presets = [
+            {
+                **preset.model_dump(exclude={"parameters"}),
+                "messages": MessageStorage.get_messages(preset.id),
+                "parameters": PresetParametersCache.get_parameters(preset),
+            }
+            for preset in presets
+        ]
+    else:
+        own_presets = session.exec(
+            select(Preset).where(
                 Preset.owner_id == user.id,
-                Preset.visibility == PresetVisibility.public,
-                and_(
-                    user.permission >= 2, Preset.visibility == PresetVisibility.unlisted
-                ),
+                Preset.visibility != PresetVisibility.public,
             )
+        ).all()
+        presets = PresetCatalog.get_presets() + [
+            PresetRead.model_validate(
+                {
+                    **preset.model_dump(exclude={"parameters"}),
+                    "messages": MessageStorage.get_messages(preset.id),
+                    "parameters": PresetParametersCache.get_parameters(preset),
+                }
+            )
+            for preset in own_presets
+        ]
+        presets = apply_keyset_to_list(presets, Preset, order_by, order, cursor)
+        presets = presets[offset : offset + limit]
+        next_cursor = get_next_cursor(presets, order_by, order, limit)
+
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return presets
+
+
+@router.get(
+    "/search",
+    response_model=list[PresetRead],
+    responses=ExceptionResponse.get_responses(400, 401),
+)
+async def search_presets(
+    session: ReadSessionDep,
+    user: UserDep,
+    response: Response,
+    q: str,
+    offset: int = 0,
+    limit: int = 10,
+    order_by: OrderBy = OrderBy.CREATE_TIME,
+    order: Order = Order.DESC,
+    cursor: Optional[str] = None,
+):
+    def fetch(preset_ids: list[UUID], limit: int) -> list[Preset]:
+        statement = apply_keyset(
+            select(Preset).where(
+                Preset.id.in_(preset_ids),
+                or_(
+                    Preset.owner_id == user.id,
+                    Preset.visibility == PresetVisibility.public,
+                    and_(
+                        user.permission >= 2,
+                        Preset.visibility == PresetVisibility.unlisted,
+                    ),
+                ),
+            ),
+            Preset,
+            order_by,
+            order,
+            cursor,
         )
-        .order_by(order_expr)
-        .offset(offset)
-        .limit(limit)
+        return session.exec(statement.limit(limit)).all()
+
+    presets = SearchManager.paginate(
+        SearchManager.search_presets(q),
+        fetch,
+        Preset,
+        order_by,
+        order,
+        offset,
+        limit,
+        cursor,
     )
+
+    next_cursor = get_next_cursor(presets, order_by, order, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
+        {
+            **preset.model_dump(exclude={"parameters"}),
+            "messages": MessageStorage.get_messages(preset.id),
+            "parameters": PresetParametersCache.get_parameters(preset),
+        }
+        for preset in presets
+    ]
+
+
+@router.get(
+    "/trending",
+    response_model=list[PresetRead],
+    responses=ExceptionResponse.get_responses(401),
+)
+async def list_trending_presets(
+    session: ReadSessionDep, _user: UserDep, offset: int = 0, limit: int = 10
+):
+    preset_ids = LikeManager.get_trending_preset_ids(offset, limit)
+    presets = session.exec(
+        select(Preset).where(
+            Preset.id.in_([UUID(preset_id) for preset_id in preset_ids]),
+            Preset.visibility == PresetVisibility.public,
+        )
+    ).all()
+    presets = sorted(presets, key=lambda preset: preset.like_count, reverse=True)
     return [
         {
             **preset.model_dump(exclude={"parameters"}),
             "messages": MessageStorage.get_messages(preset.id),
-            "parameters": PresetParameters.model_validate_json(preset.parameters),
+            "parameters": PresetParametersCache.get_parameters(preset),
         }
-        for preset in presets.all()
+        for preset in presets
     ]
 
 
@@ -70,17 +185,21 @@ async def create_preset(session: SessionDep, user: UserDep, preset: PresetCreate
         )
     db_preset = Preset(
         **preset.model_dump(exclude={"parameters"}),
-        parameters=preset.parameters.model_dump_json(),
+        parameters=preset.parameters.model_dump(mode="json"),
         owner_id=user.id
     )
     session.add(db_preset)
     session.commit()
     session.refresh(db_preset)
     MessageStorage.set_messages(db_preset.id, preset.messages)
+    LikeManager.update_trending(db_preset)
+    SearchManager.index_preset(db_preset)
+    if db_preset.visibility == PresetVisibility.public:
+        PresetCatalog.invalidate()
     return {
         **db_preset.model_dump(exclude={"parameters"}),
         "messages": MessageStorage.get_messages(db_preset.id),
-        "parameters": PresetParameters.model_validate_json(db_preset.parameters),
+        "parameters": PresetParametersCache.get_parameters(db_preset),
     }
 
 
@@ -89,7 +208,7 @@ async def create_preset(session: SessionDep, user: UserDep, preset: PresetCreate
     response_model=PresetRead,
     responses=ExceptionResponse.get_responses(401, 403, 404),
 )
-async def read_preset(preset_id: str, session: SessionDep, user: UserDep):
+async def read_preset(preset_id: str, session: ReadSessionDep, user: UserDep):
     preset = session.get(Preset, preset_id)
     if preset is None:
         raise HTTPException(
@@ -103,7 +222,7 @@ async def read_preset(preset_id: str, session: SessionDep, user: UserDep):
     return {
         **preset.model_dump(exclude={"parameters"}),
         "messages": MessageStorage.get_messages(preset.id),
-        "parameters": PresetParameters.model_validate_json(preset.parameters),
+        "parameters": PresetParametersCache.get_parameters(preset),
     }
 
 
@@ -135,16 +254,22 @@ async def update_preset(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Insufficient permissions: You cannot set preset visibility to public",
         )
+    was_public = db_preset.visibility == PresetVisibility.public
     db_preset.sqlmodel_update(preset.model_dump(exclude={"parameters"}))
-    db_preset.parameters = preset.parameters.model_dump_json()
+    db_preset.parameters = preset.parameters.model_dump(mode="json")
     db_preset.update_time = datetime.now()
     session.commit()
     session.refresh(db_preset)
     MessageStorage.set_messages(db_preset.id, preset.messages)
+    LikeManager.update_trending(db_preset)
+    SearchManager.index_preset(db_preset)
+    PresetParametersCache.invalidate(db_preset.id)
+    if was_public or db_preset.visibility == PresetVisibility.public:
+        PresetCatalog.invalidate()
     return {
         **db_preset.model_dump(exclude={"parameters"}),
         "messages": MessageStorage.get_messages(db_preset.id),
-        "parameters": PresetParameters.model_validate_json(db_preset.parameters),
+        "parameters": PresetParametersCache.get_parameters(db_preset),
     }
 
 
@@ -169,7 +294,13 @@ async def delete_preset(preset_id: str, session: SessionDep, user: UserDep):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Insufficient permissions: You cannot delete public presets",
         )
+    was_public = db_preset.visibility == PresetVisibility.public
     session.delete(db_preset)
     session.commit()
     MessageStorage.delete_messages(preset_id)
+    LikeManager.remove_trending(preset_id)
+    PresetParametersCache.invalidate(preset_id)
+    SearchManager.remove_preset(preset_id)
+    if was_public:
+        PresetCatalog.invalidate()
     return {"message": "Preset deleted successfully"}
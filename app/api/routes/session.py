@@ -3,7 +3,8 @@ from sqlmodel import select
 from app.models.user import User
 from app.models.security import Token, WechatToken
 from app.core.clients.wechat import wechat_client_async
-from app.core.security import verify_password, create_token
+from app.core.security import verify_and_update_password_async, create_token
+from app.core.managers.user import UserCache
 from app.core.config import config
 from app.api.deps import SessionDep, LoginDep, RefreshDep
 from app.api.resps import ExceptionResponse
@@ -16,17 +17,30 @@ router = APIRouter()
 @router.post(
     "/oauth2/token",
     response_model=Token,
-    responses=ExceptionResponse.get_responses(401),
+    responses=ExceptionResponse.get_responses(401, 503),
 )
 async def login_for_access_token(session: SessionDep, login_credentials: LoginDep):
     user = session.exec(
         select(User).where(User.username == login_credentials.username)
     ).one_or_none()
-    if not user or not verify_password(login_credentials.password, user.password_hash):
+    if user and user.password_hash:
+        verified, new_hash = await verify_and_update_password_async(
+            login_credentials.password, user.password_hash
+        )
+    else:
+        verified, new_hash = False, None
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
         )
+    if new_hash is not None:
+        # Rehash with the current bcrypt settings while the password is at hand
+        user.password_hash = new_hash
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        UserCache.invalidate(user.id)
     access_token_expires = timedelta(minutes=config.jwt_access_token_expires)
     access_token = create_token(subject=user.id, expires_delta=access_token_expires)
     return {"access_token": access_token, "token_type": "bearer"}
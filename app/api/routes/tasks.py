@@ -2,11 +2,12 @@ from fastapi import BackgroundTasks, APIRouter, HTTPException, status
 from fastapi.responses import StreamingResponse
 from app.api.deps import UserDep, SessionDep
 from app.api.resps import ExceptionResponse
-from app.models.task import Task, TaskType, TaskCreate, TaskStatus
+from app.models.task import Task, TaskType, TaskCreate, TaskStatus, TaskTrace
 from app.models.server import ServerMessage
 from app.models.chat import Chat
 from app.core.stream import TaskStreaming
 from app.core.managers.task import TaskManager
+from app.core.managers.credit import CreditManager
 from app.core.tasks.chat_generation import ChatGenerationTask
 from app.core.tasks.title_generation import TitleGenerationTask
 
@@ -24,12 +25,6 @@ async def create_task(
     task: TaskCreate,
     background_tasks: BackgroundTasks,
 ):
-    if user.credits_left <= 0 and user.permission < 2:
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail="Insufficient credits: Please purchase more credits",
-        )
-
     chat = session.get(Chat, task.chat_id)
     if chat is None:
         raise HTTPException(
@@ -46,6 +41,12 @@ async def create_task(
     elif task.type == TaskType.title_generation:
         background_task = TitleGenerationTask()
 
+    CreditManager.reserve_credit(
+        user,
+        background_task.task_id,
+        background_task.estimate_credit_cost(chat),
+        force=user.permission >= 2,
+    )
     background_tasks.add_task(background_task.run, task.chat_id)
     return Task(task_id=background_task.task_id, status=TaskStatus.pending)
 
@@ -74,6 +75,15 @@ async def delete_task(task_id: str):
     return {"message": f"Task {task_id} deleted successfully"}
 
 
+@router.get(
+    "/{task_id}/trace",
+    response_model=TaskTrace,
+    responses=ExceptionResponse.get_responses(404),
+)
+async def read_task_trace(task_id: str):
+    return TaskManager.get_trace(task_id)
+
+
 @router.get(
     "/{task_id}/stream",
     response_class=StreamingResponse,
@@ -1,14 +1,21 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Response, status
 from fastapi.responses import RedirectResponse
-from app.models.user import User, UserCreate, UserRead, UserBase
+from app.models.user import User, UserCreate, UserRead, UserBase, AvatarSize
 from app.models.security import PasswordUpdate
 from app.models.server import ServerMessage
-from app.api.deps import SessionDep, UserDep, AdminDep
+from app.models.task import Task, TaskStatus
+from app.models.order import OrderBy, Order
+from app.api.deps import SessionDep, ReadSessionDep, UserDep, AdminDep
 from app.api.resps import ExceptionResponse
 from app.api.routes import me
-from app.core.security import get_password_hash
-from app.core.config import config
+from app.core.security import get_password_hash_async
+from app.core.pagination import apply_keyset, get_next_cursor
+from app.core.managers.task import TaskManager
+from app.core.managers.user import UserCache
+from app.core.managers.static import StaticFilesManager
+from app.core.tasks.user_deletion import UserDeletionTask
 from sqlmodel import select
+from typing import Optional
 
 router = APIRouter()
 router.include_router(me.router, prefix="/me")
@@ -17,17 +24,29 @@ router.include_router(me.router, prefix="/me")
 @router.get(
     "",
     response_model=list[UserRead],
-    responses=ExceptionResponse.get_responses(401, 403),
+    responses=ExceptionResponse.get_responses(400, 401, 403),
 )
 async def list_users(
-    _admin: AdminDep, session: SessionDep, offset: int = 0, limit: int = 10
+    _admin: AdminDep,
+    session: ReadSessionDep,
+    response: Response,
+    offset: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
 ):
-    users = session.exec(select(User).offset(offset).limit(limit))
-    return users.all()
+    statement = apply_keyset(select(User), User, OrderBy.ID, Order.ASC, cursor)
+    users = session.exec(statement.offset(offset).limit(limit)).all()
+
+    next_cursor = get_next_cursor(users, OrderBy.ID, Order.ASC, limit)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return users
 
 
 @router.post(
-    "", response_model=UserRead, responses=ExceptionResponse.get_responses(400, 403)
+    "",
+    response_model=UserRead,
+    responses=ExceptionResponse.get_responses(400, 403, 503),
 )
 async def create_user(session: SessionDep, user: UserCreate):
     if user.permission >= 2:
@@ -39,7 +58,7 @@ async def create_user(session: SessionDep, user: UserCreate):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Username already exists"
         )
-    password_hash = get_password_hash(user.password)
+    password_hash = await get_password_hash_async(user.password)
     db_user = User(**user.model_dump(), password_hash=password_hash)
     session.add(db_user)
     session.commit()
@@ -52,7 +71,7 @@ async def create_user(session: SessionDep, user: UserCreate):
     response_model=UserRead,
     responses=ExceptionResponse.get_responses(401, 404),
 )
-async def read_user(_user: UserDep, user_id: int, session: SessionDep):
+async def read_user(_user: UserDep, user_id: int, session: ReadSessionDep):
     user = session.get(User, user_id)
     if user is None:
         raise HTTPException(
@@ -94,29 +113,37 @@ async def update_user(
     session.add(db_user)
     session.commit()
     session.refresh(db_user)
+    UserCache.invalidate(db_user.id)
     return db_user
 
 
 @router.delete(
     "/{user_id}",
-    response_model=ServerMessage,
+    response_model=Task,
     responses=ExceptionResponse.get_responses(401, 403, 404),
 )
-async def delete_user(_admin: AdminDep, user_id: int, session: SessionDep):
+async def delete_user(
+    _admin: AdminDep,
+    user_id: int,
+    session: SessionDep,
+    background_tasks: BackgroundTasks,
+):
     db_user = session.get(User, user_id)
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-    session.delete(db_user)
-    session.commit()
-    return {"message": "User deleted successfully"}
+    deletion_task = UserDeletionTask()
+    TaskManager.set_task(deletion_task.task_id, TaskStatus.pending)
+    TaskManager.set_progress(deletion_task.task_id, 0)
+    background_tasks.add_task(deletion_task.run, user_id)
+    return Task(task_id=deletion_task.task_id, status=TaskStatus.pending, progress=0)
 
 
 @router.put(
     "/{user_id}/password",
     response_model=ServerMessage,
-    responses=ExceptionResponse.get_responses(401, 403, 404),
+    responses=ExceptionResponse.get_responses(401, 403, 404, 503),
 )
 async def reset_user_password(
     _admin: AdminDep, user_id: int, session: SessionDep, password: PasswordUpdate
@@ -126,9 +153,10 @@ async def reset_user_password(
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-    db_user.password_hash = get_password_hash(password.new_password)
+    db_user.password_hash = await get_password_hash_async(password.new_password)
     session.add(db_user)
     session.commit()
+    UserCache.invalidate(db_user.id)
     return {"message": "Password updated successfully"}
 
 
@@ -137,10 +165,16 @@ async def reset_user_password(
     response_class=RedirectResponse,
     responses=ExceptionResponse.get_responses(401, 404),
 )
-async def get_user_avatar(_user: UserDep, user_id: int, session: SessionDep):
-    db_user = session.get(User, user_id)
+async def get_user_avatar(
+    _user: UserDep,
+    user_id: int,
+    session: ReadSessionDep,
+    size: AvatarSize = AvatarSize.large,
+):
+    db_user = UserCache.get_user(user_id) or session.get(User, user_id)
     if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
-    return RedirectResponse(f"{config.api_base_url}{db_user.avatar}")
+    avatar_url = await StaticFilesManager.get_avatar_variant(db_user.avatar, size)
+    return RedirectResponse(StaticFilesManager.get_url(avatar_url))
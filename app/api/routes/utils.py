@@ -1,11 +1,30 @@
 from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import HTMLResponse
 from app.api.deps import SessionDep
 from app.api.resps import ExceptionResponse
-from app.core.connections.sql import sqlalchemy_engine, init_db, drop_db
+from app.core.connections.sql import (
+    sqlalchemy_engine,
+    init_db,
+    upgrade_db,
+    drop_db,
+    get_pool_status,
+)
+from app.core.connections.replica import ReplicaRouter
 from app.core.config import config
-from app.core.security import get_password_hash
+from app.core.security import get_password_hash_async, PasswordHasher
+from app.core.managers.ledger import CreditLedger
+from app.core.managers.like import LikeManager
+from app.core.managers.search import SearchManager
+from app.core.managers.profile import ProfileManager
 from app.models.user import User, UserRead
-from app.models.server import ServerMessage
+from app.models.server import (
+    ServerMessage,
+    PoolStatus,
+    ReplicaStatus,
+    PasswordHasherStatus,
+    RequestProfile,
+)
+from app.models.credit import CreditLedgerStatus
 from sqlmodel import select
 
 router = APIRouter()
@@ -17,6 +36,20 @@ async def init():
     return {"message": "Database initialized"}
 
 
+@router.get("/upgrade", response_model=ServerMessage)
+async def upgrade():
+    upgrade_db()
+    LikeManager.rebuild_like_counts()
+    SearchManager.rebuild_index()
+    return {"message": "Database upgraded"}
+
+
+@router.get("/reindex", response_model=ServerMessage)
+async def reindex():
+    SearchManager.rebuild_index()
+    return {"message": "Search index rebuilt"}
+
+
 @router.get(
     "/admin",
     response_model=UserRead,
@@ -29,7 +62,7 @@ async def create_admin(session: SessionDep):
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Admin user already exists",
             )
-        password_hash = get_password_hash(config.admin_passwd)
+        password_hash = await get_password_hash_async(config.admin_passwd)
         admin = User(
             username=config.admin_user,
             password_hash=password_hash,
@@ -49,3 +82,48 @@ async def create_admin(session: SessionDep):
 async def drop():
     drop_db()
     return {"message": "Database dropped"}
+
+
+@router.get("/ledger", response_model=CreditLedgerStatus)
+async def ledger_status():
+    pending, lag = CreditLedger.get_lag()
+    return {"pending": pending, "lag": lag}
+
+
+@router.get(
+    "/pool",
+    response_model=PoolStatus,
+    responses=ExceptionResponse.get_responses(501),
+)
+async def pool_status():
+    status_dict = get_pool_status()
+    if not status_dict:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Connection pool is not instrumented",
+        )
+    return status_dict
+
+
+@router.get("/replicas", response_model=list[ReplicaStatus])
+async def replica_status():
+    return ReplicaRouter.get_status()
+
+
+@router.get("/password", response_model=PasswordHasherStatus)
+async def password_hasher_status():
+    return PasswordHasher.status_dict()
+
+
+@router.get("/profiles", response_model=list[RequestProfile])
+async def list_profiles():
+    return ProfileManager.list_profiles()
+
+
+@router.get(
+    "/profiles/{profile_id}",
+    response_class=HTMLResponse,
+    responses=ExceptionResponse.get_responses(404),
+)
+async def read_profile(profile_id: str):
+    return HTMLResponse(ProfileManager.get_profile(profile_id))
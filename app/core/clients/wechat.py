@@ -1,33 +1,72 @@
-from aiohttp import ClientSession
+from aiohttp import ClientSession, ClientTimeout
 from app.core.config import config
-from app.core.connections.redis import redis_client
+from app.core.connections.redis import redis_client, RELEASE_LOCK_SCRIPT
+from app.core.log import logger
 from fastapi import HTTPException, status
+from typing import Optional
+from uuid import uuid4
+import asyncio
 import hashlib
-import requests
 import json
 
 
-class Wechat:
+class WechatAsync:
+    """
+    WeChat API client sharing one HTTP session for all calls.
+
+    The access token is shared by every worker through Redis. Refreshes are
+    single-flight: within a process concurrent callers await the same refresh,
+    and across processes a Redis lock lets only one of them call WeChat while
+    the others wait for the new token to appear.
+    """
+
     def __init__(self, appid: str, secret: str):
         self.appid = appid
         self.secret = secret
+        self.session: Optional[ClientSession] = None
+        self.session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    def get_session(self) -> ClientSession:
+        # A session is bound to the event loop it was created on
+        loop = asyncio.get_running_loop()
+        if self.session is None or self.session.closed or self.session_loop is not loop:
+            self.session = ClientSession(
+                timeout=ClientTimeout(total=config.wechat_request_timeout)
+            )
+            self.session_loop = loop
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        return None
 
-    def wechat_login(self, code) -> tuple[str, str]:
+    async def get_json(self, url: str) -> dict:
+        async with self.get_session().get(url) as response:
+            if response.status != 200:
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"WeChat server error: {response.status}",
+                )
+            # Fuck, don't you know you have to use MIME type 'application/json' to transfer JSON data? Fuck you, WeChat. Fuck you, Tencent.
+            # 操你妈的，你他妈的不知道你要用 MIME 类型 'application/json' 来传输 JSON 数据吗？操你妈的，微信。操你妈的，腾讯。
+            # return await response.json()
+            return json.loads(await response.text())
+
+    async def wechat_login(self, code) -> tuple[str, str]:
         """
         Get the user's openid and session_key from WeChat.
         """
         url = f"https://api.weixin.qq.com/sns/jscode2session?appid={self.appid}&secret={self.secret}&js_code={code}&grant_type=authorization_code"
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"WeChat server error: {response.status_code}",
-            )
-        # Fuck, don't you know you have to use MIME type 'application/json' to transfer JSON data? Fuck you, WeChat. Fuck you, Tencent.
-        # 操你妈的，你他妈的不知道你要用 MIME 类型 'application/json' 来传输 JSON 数据吗？操你妈的，微信。操你妈的，腾讯。
-        # data = response.json()
-        data = json.loads(response.text)
+        data = await self.get_json(url)
         if "errcode" in data and data["errcode"] != 0:
+            if data["errcode"] == 40029:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Invalid code",
+                )
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"WeChat server error: {data['errcode']}, {data['errmsg']}",
@@ -36,22 +75,14 @@ class Wechat:
         session_key = data["session_key"]
         return openid, session_key
 
-    def check_wechat_session(self, openid, session_key) -> bool:
+    async def check_wechat_session(self, openid, session_key) -> bool:
         """
         Check the user's openid and session_key from WeChat.
         """
         signature = hashlib.sha256(f"{session_key}{openid}".encode("utf-8")).hexdigest()
-        url = f"GET https://api.weixin.qq.com/wxa/checksession?access_token={self.access_token}&signature={signature}&openid={openid}&sig_method=hmac_sha256"
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"WeChat server error: {response.status_code}",
-            )
-        # Fuck, don't you know you have to use MIME type 'application/json' to transfer JSON data? Fuck you, WeChat. Fuck you, Tencent.
-        # 操你妈的，你他妈的不知道你要用 MIME 类型 'application/json' 来传输 JSON 数据吗？操你妈的，微信。操你妈的，腾讯。
-        # data = response.json()
-        data = json.loads(response.text)
+        access_token = await self.get_access_token()
+        url = f"https://api.weixin.qq.com/wxa/checksession?access_token={access_token}&signature={signature}&openid={openid}&sig_method=hmac_sha256"
+        data = await self.get_json(url)
         if "errcode" in data and data["errcode"] != 0:
             if data["errcode"] == 87009:
                 return False
@@ -61,144 +92,106 @@ class Wechat:
             )
         return True
 
-    def refresh_access_token(self) -> str:
+    async def fetch_access_token(self) -> str:
         """
-        Get the access token from WeChat and return.
+        Get the access token from WeChat and store it in Redis.
         """
         url = f"https://api.weixin.qq.com/cgi-bin/token?grant_type=client_credential&appid={self.appid}&secret={self.secret}"
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"WeChat server error: {response.status_code}",
-            )
-        # Fuck, don't you know you have to use MIME type 'application/json' to transfer JSON data? Fuck you, WeChat. Fuck you, Tencent.
-        # 操你妈的，你他妈的不知道你要用 MIME 类型 'application/json' 来传输 JSON 数据吗？操你妈的，微信。操你妈的，腾讯。
-        # data = response.json()
-        data = json.loads(response.text)
+        data = await self.get_json(url)
         if "errcode" in data:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"WeChat server error: {data['errcode']}, {data['errmsg']}",
             )
         redis_client.set(
-            "wechat_access_token", data["access_token"], ex=data["expires_in"] - 60
+            "wechat_access_token",
+            data["access_token"],
+            ex=data["expires_in"] - 60,
         )
         return data["access_token"]
 
-    def get_access_token(self) -> str:
+    def get_cached_access_token(self) -> tuple[Optional[str], int]:
         """
-        Get the access token from Redis. If the access token is not found or is about to expire, refresh it and store it in Redis.
+        Return the access token in Redis and its remaining lifetime in seconds.
         """
-        access_token = redis_client.get("wechat_access_token")
-        if not access_token or redis_client.ttl("wechat_access_token") < 300:
-            return self.refresh_access_token()
-        return access_token
-
-    @property
-    def access_token(self) -> str:
-        return self.get_access_token()
-
+        pipeline = redis_client.pipeline()
+        pipeline.get("wechat_access_token")
+        pipeline.ttl("wechat_access_token")
+        access_token, ttl = pipeline.execute()
+        return access_token, ttl
 
-class WechatAsync:
-    def __init__(self, appid: str, secret: str):
-        self.appid = appid
-        self.secret = secret
-
-    async def wechat_login(self, code) -> tuple[str, str]:
-        """
-        Get the user's openid and session_key from WeChat.
-        """
-        url = f"https://api.weixin.qq.com/sns/jscode2session?appid={self.appid}&secret={self.secret}&js_code={code}&grant_type=authorization_code"
-        async with ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"WeChat server error: {response.status}",
-                    )
-                # Fuck, don't you know you have to use MIME type 'application/json' to transfer JSON data? Fuck you, WeChat. Fuck you, Tencent.
-                # 操你妈的，你他妈的不知道你要用 MIME 类型 'application/json' 来传输 JSON 数据吗？操你妈的，微信。操你妈的，腾讯。
-                # data = await response.json()
-                data = json.loads(await response.text())
-                if "errcode" in data and data["errcode"] != 0:
-                    if data["errcode"] == 40029:
-                        raise HTTPException(
-                            status_code=status.HTTP_401_UNAUTHORIZED,
-                            detail="Invalid code",
-                        )
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"WeChat server error: {data['errcode']}, {data['errmsg']}",
+    async def refresh_access_token_locked(self) -> str:
+        lock_owner = uuid4().hex
+        while True:
+            access_token, ttl = self.get_cached_access_token()
+            if access_token and ttl >= config.wechat_access_token_refresh_margin:
+                return access_token
+            if redis_client.set(
+                "wechat_access_token_lock",
+                lock_owner,
+                nx=True,
+                ex=config.wechat_access_token_lock_timeout,
+            ):
+                try:
+                    return await self.fetch_access_token()
+                finally:
+                    RELEASE_LOCK_SCRIPT(
+                        keys=["wechat_access_token_lock"], args=[lock_owner]
                     )
-                openid = data["openid"]
-                session_key = data["session_key"]
-                return openid, session_key
+            # Another worker is refreshing, wait for its token or its lock to expire
+            await asyncio.sleep(0.1)
 
-    async def check_wechat_session(self, openid, session_key) -> bool:
+    def start_refresh(self) -> asyncio.Task:
         """
-        Check the user's openid and session_key from WeChat.
+        Start a refresh unless one is already running in this process.
         """
-        signature = hashlib.sha256(f"{session_key}{openid}".encode("utf-8")).hexdigest()
-        access_token = await self.get_access_token()
-        url = f"GET https://api.weixin.qq.com/wxa/checksession?access_token={access_token}&signature={signature}&openid={openid}&sig_method=hmac_sha256"
-        async with ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"WeChat server error: {response.status}",
-                    )
-                # Fuck, don't you know you have to use MIME type 'application/json' to transfer JSON data? Fuck you, WeChat. Fuck you, Tencent.
-                # 操你妈的，你他妈的不知道你要用 MIME 类型 'application/json' 来传输 JSON 数据吗？操你妈的，微信。操你妈的，腾讯。
-                # data = await response.json()
-                data = json.loads(await response.text())
-                if "errcode" in data and data["errcode"] != 0:
-                    if data["errcode"] == 87009:
-                        return False
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"WeChat server error: {data['errcode']}, {data['errmsg']}",
-                    )
-                return True
+        loop = asyncio.get_running_loop()
+        task = self.refresh_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            task = loop.create_task(self.refresh_access_token_locked())
+            task.add_done_callback(self.on_refresh_done)
+            self.refresh_task = task
+        return task
+
+    @staticmethod
+    def on_refresh_done(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Failed to refresh WeChat access token: {task.exception()}")
+        return None
 
     async def refresh_access_token(self) -> str:
         """
-        Get the access token from WeChat and return.
+        Refresh the access token, sharing the refresh with concurrent callers.
         """
-        url = f"https://api.weixin.qq.com/cgi-bin/token?grant_type=client_credential&appid={self.appid}&secret={self.secret}"
-        async with ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status != 200:
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"WeChat server error: {response.status}",
-                    )
-                # Fuck, don't you know you have to use MIME type 'application/json' to transfer JSON data? Fuck you, WeChat. Fuck you, Tencent.
-                # 操你妈的，你他妈的不知道你要用 MIME 类型 'application/json' 来传输 JSON 数据吗？操你妈的，微信。操你妈的，腾讯。
-                # data = await response.json()
-                data = json.loads(await response.text())
-                if "errcode" in data:
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail=f"WeChat server error: {data['errcode']}, {data['errmsg']}",
-                    )
-                redis_client.set(
-                    "wechat_access_token",
-                    data["access_token"],
-                    ex=data["expires_in"] - 60,
-                )
-                return data["access_token"]
+        # A cancelled caller must not cancel the refresh the others are waiting on
+        return await asyncio.shield(self.start_refresh())
 
     async def get_access_token(self) -> str:
         """
-        Get the access token from Redis. If the access token is not found or is about to expire, refresh it and store it in Redis.
+        Get the access token from Redis. A token about to expire is still returned
+        while a refresh runs in the background, only a missing token is waited for.
         """
-        access_token = redis_client.get("wechat_access_token")
-        if not access_token or redis_client.ttl("wechat_access_token") < 300:
-            return await self.refresh_access_token()
-        return access_token
+        access_token, ttl = self.get_cached_access_token()
+        if access_token and ttl >= config.wechat_access_token_refresh_margin:
+            return access_token
+        if access_token:
+            self.start_refresh()
+            return access_token
+        return await self.refresh_access_token()
+
+    async def run_forever(self) -> None:
+        """
+        Refresh the access token before it expires, so requests rarely wait on WeChat.
+        """
+        while True:
+            access_token, ttl = self.get_cached_access_token()
+            if not access_token or ttl < config.wechat_access_token_refresh_margin:
+                try:
+                    await self.refresh_access_token()
+                except Exception:
+                    # Already logged by the refresh task, retry on the next check
+                    pass
+            await asyncio.sleep(config.wechat_access_token_check_interval)
 
 
-wechat_client = Wechat(config.wechat_appid, config.wechat_secret)
 wechat_client_async = WechatAsync(config.wechat_appid, config.wechat_secret)
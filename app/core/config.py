@@ -12,6 +12,12 @@ class Config(BaseSettings):
     project_name: str = Field(default="AIDeer API")
     debug: bool = Field(default=True)
 
+    # Log settings
+    log_level: str = Field(default="INFO")
+    log_levels: str = Field(default="")
+    log_format: str = Field(default="json", pattern="^(text|json)$")
+    log_access_sample_rate: float = Field(default=1, ge=0, le=1)
+
     # API settings
     api_base_url: str = Field(default="http://127.0.0.1:8000")
     api_version: str = Field(default="v1")
@@ -20,6 +26,43 @@ class Config(BaseSettings):
 
     # SQL settings
     database_url: str = Field(default="sqlite:///./test.db")
+    database_pool_size: int = Field(default=10, ge=1)
+    database_max_overflow: int = Field(default=20, ge=-1)
+    database_pool_timeout: float = Field(default=30, gt=0)
+    database_pool_recycle: int = Field(default=60 * 30, ge=-1)
+    database_pool_pre_ping: bool = Field(default=True)
+    database_pool_slow_checkout: float = Field(default=0.1, ge=0)
+    database_replica_urls: str = ""
+    database_replica_max_lag: float = Field(default=5, ge=0)
+    database_replica_check_interval: float = Field(default=5, gt=0)
+
+    # Credit ledger settings
+    credit_ledger_batch_size: int = Field(default=200, gt=0)
+    credit_ledger_flush_interval: float = Field(default=5, gt=0)
+    credit_compaction_days: int = Field(default=180, gt=0)
+    credit_compaction_interval: int = Field(default=60 * 60 * 24, gt=0)
+    credit_reservation_timeout: int = Field(default=60 * 60, gt=0)
+    credit_reservation_reap_interval: float = Field(default=60, gt=0)
+    credit_prompt_bytes_per_token: float = Field(default=3, gt=0)
+
+    # Preset settings
+    preset_parameters_cache_size: int = Field(default=1024, ge=0)
+    preset_catalog_ttl: int = Field(default=60 * 60, gt=0)
+    preset_default_max_tokens: int = Field(default=2000, gt=0)
+
+    # User cache settings
+    user_cache_ttl: int = Field(default=60 * 5, gt=0)
+    user_cache_local_ttl: float = Field(default=5, ge=0)
+    user_cache_size: int = Field(default=10000, ge=0)
+    user_token_cache_size: int = Field(default=10000, ge=0)
+
+    # User deletion settings
+    user_deletion_batch_size: int = Field(default=500, gt=0)
+
+    # Search settings
+    search_max_prefix_length: int = Field(default=20, gt=0)
+    search_result_ttl: int = Field(default=30, gt=0)
+    search_max_results: int = Field(default=5000, gt=0)
 
     # Redis settings
     redis_host: str = Field(default="localhost")
@@ -37,9 +80,18 @@ class Config(BaseSettings):
     jwt_wechat_access_token_expires: int = Field(default=60 * 24, ge=0)
     jwt_refresh_token_expires: int = Field(default=60 * 24 * 90, ge=0)
 
+    # Password hashing settings
+    password_bcrypt_rounds: int = Field(default=12, ge=4, le=31)
+    password_hash_workers: int = Field(default=4, ge=1)
+    password_hash_max_queue: int = Field(default=64, ge=1)
+
     # WeChat Mini Program settings
     wechat_appid: str = ""
     wechat_secret: str = ""
+    wechat_request_timeout: float = Field(default=10, gt=0)
+    wechat_access_token_refresh_margin: int = Field(default=300, ge=0)
+    wechat_access_token_check_interval: float = Field(default=60, gt=0)
+    wechat_access_token_lock_timeout: int = Field(default=15, ge=1)
 
     # Dashscope settings
     dashscope_base_url: str = Field(default="https://dashscope.aliyuncs.com/api/v1")
@@ -60,6 +112,39 @@ class Config(BaseSettings):
     # Static files settings
     static_dir: str = Field(default="static")
     static_url: str = Field(default="/static")
+    static_cache_max_age: int = Field(default=60 * 60 * 24 * 365, ge=0)
+    static_offload_mode: str = Field(
+        default="none", pattern="^(none|x-accel-redirect|x-sendfile)$"
+    )
+    static_offload_location: str = Field(default="/internal-static")
+    avatar_max_upload_size: int = Field(default=10 * 1024 * 1024, ge=1)
+    avatar_process_workers: int = Field(default=2, ge=1)
+    chat_image_max_upload_size: int = Field(default=10 * 1024 * 1024, ge=1)
+    chat_image_preview_size: int = Field(default=512, ge=16)
+
+    # Storage settings
+    storage_backend: str = Field(default="local", pattern="^(local|s3)$")
+    s3_endpoint_url: str = ""
+    s3_region: str = ""
+    s3_bucket: str = ""
+    s3_access_key: str = ""
+    s3_secret_key: str = ""
+    s3_public_url: str = ""
+
+    # Metrics settings
+    metrics_enabled: bool = Field(default=True)
+    metrics_multiproc_dir: str = Field(default="")
+
+    # Tracing settings
+    task_trace_retention: int = Field(default=60 * 60 * 24, ge=1)
+    task_trace_otel_enabled: bool = Field(default=False)
+
+    # Profiler settings
+    profiler_enabled: bool = Field(default=False)
+    profiler_sample_rate: float = Field(default=0, ge=0, le=1)
+    profiler_interval: float = Field(default=0.001, gt=0)
+    profiler_max_profiles: int = Field(default=50, ge=1)
+    profiler_retention: int = Field(default=60 * 60 * 24, ge=1)
 
     # Prompt settings
     title_generation_prompt: str = Field(
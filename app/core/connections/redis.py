@@ -1,7 +1,25 @@
 from redis import Redis
 from app.core.config import config
+from app.core.metrics import REDIS_COMMAND_DURATION
+import time
 
-redis_client = Redis(
+
+class InstrumentedRedis(Redis):
+    """
+    Redis client that records the latency of every command.
+    """
+
+    def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(
+                time.perf_counter() - start
+            )
+
+
+redis_client = InstrumentedRedis(
     host=config.redis_host,
     port=config.redis_port,
     db=config.redis_db,
@@ -9,3 +27,16 @@ redis_client = Redis(
     encoding="utf-8",
     decode_responses=True,
 )
+
+# Release a lock only if it is still held by the given owner, so a holder that
+# outlived its lock never drops the lock of the next holder.
+# KEYS: lock key
+# ARGV: owner token
+RELEASE_LOCK_SCRIPT = redis_client.register_script(
+    """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+)
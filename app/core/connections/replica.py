@@ -0,0 +1,150 @@
+from sqlmodel import Session
+from sqlalchemy import Delete, Insert, Update, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from app.core.connections.sql import sqlalchemy_engine, create_sql_engine
+from app.core.config import config
+from app.core.log import logger
+import asyncio
+import itertools
+
+replica_engines = [
+    create_sql_engine(url.strip())
+    for url in config.database_replica_urls.split(",")
+    if url.strip()
+]
+
+
+def get_replica_lag(engine: Engine) -> float:
+    """
+    Return the replication lag of a replica in seconds, or raise if it is unreachable.
+    """
+    with engine.connect() as connection:
+        if engine.dialect.name == "postgresql":
+            # An idle primary leaves the replay timestamp behind, so only report
+            # lag while there is WAL left to replay
+            lag = connection.execute(
+                text(
+                    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+                    "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+                )
+            ).scalar()
+        elif engine.dialect.name == "mysql":
+            row = connection.execute(text("SHOW REPLICA STATUS")).mappings().first()
+            lag = row and row.get("Seconds_Behind_Source")
+            if row is not None and lag is None:
+                raise RuntimeError("Replication is not running")
+        else:
+            connection.execute(text("SELECT 1"))
+            lag = 0
+    return float(lag or 0)
+
+
+class ReplicaRouter:
+    """
+    Tracks which read replicas are healthy and hands them out round-robin.
+    Replicas that fail or lag more than `database_replica_max_lag` are skipped
+    until a later check finds them healthy again.
+    """
+
+    healthy: list[Engine] = list(replica_engines)
+    lags: dict[Engine, float | None] = {engine: None for engine in replica_engines}
+    counter = itertools.count()
+
+    @staticmethod
+    def get_replica() -> Engine | None:
+        healthy = ReplicaRouter.healthy
+        if not healthy:
+            return None
+        return healthy[next(ReplicaRouter.counter) % len(healthy)]
+
+    @staticmethod
+    def mark_unhealthy(engine: Engine) -> None:
+        ReplicaRouter.healthy = [
+            replica for replica in ReplicaRouter.healthy if replica is not engine
+        ]
+        ReplicaRouter.lags[engine] = None
+        return None
+
+    @staticmethod
+    def check_replicas() -> None:
+        healthy = []
+        for engine in replica_engines:
+            try:
+                lag = get_replica_lag(engine)
+            except Exception as e:
+                logger.warning(f"Replica {engine.url!r} is unavailable: {e}")
+                ReplicaRouter.lags[engine] = None
+                continue
+            ReplicaRouter.lags[engine] = lag
+            if lag > config.database_replica_max_lag:
+                logger.warning(f"Replica {engine.url!r} is lagging by {lag:.1f}s")
+                continue
+            healthy.append(engine)
+        ReplicaRouter.healthy = healthy
+        return None
+
+    @staticmethod
+    async def run_forever() -> None:
+        while True:
+            await asyncio.to_thread(ReplicaRouter.check_replicas)
+            await asyncio.sleep(config.database_replica_check_interval)
+
+    @staticmethod
+    def get_status() -> list[dict]:
+        return [
+            {
+                "url": engine.url.render_as_string(hide_password=True),
+                "healthy": engine in ReplicaRouter.healthy,
+                "lag": ReplicaRouter.lags[engine],
+            }
+            for engine in replica_engines
+        ]
+
+
+class RoutingSession(Session):
+    """
+    Session that reads from a replica and sticks to the primary from the first
+    write on, so a request always reads its own writes. A read that fails on the
+    replica is retried on the primary.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(sqlalchemy_engine, **kwargs)
+        self.replica_engine = ReplicaRouter.get_replica()
+        self.use_primary = self.replica_engine is None
+
+    def stick_to_primary(self) -> None:
+        self.use_primary = True
+        return None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or isinstance(clause, (Insert, Update, Delete)):
+            self.use_primary = True
+        if self.use_primary:
+            return sqlalchemy_engine
+        return self.replica_engine
+
+    def call_with_fallback(self, method, *args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except OperationalError:
+            if self.use_primary:
+                raise
+            # Only reads run on the replica, so they are safe to repeat
+            logger.warning(f"Replica {self.replica_engine.url!r} failed, using primary")
+            ReplicaRouter.mark_unhealthy(self.replica_engine)
+            self.stick_to_primary()
+            return method(*args, **kwargs)
+
+    def exec(self, *args, **kwargs):
+        return self.call_with_fallback(super().exec, *args, **kwargs)
+
+    def execute(self, *args, **kwargs):
+        return self.call_with_fallback(super().execute, *args, **kwargs)
+
+    def scalar(self, *args, **kwargs):
+        return self.call_with_fallback(super().scalar, *args, **kwargs)
+
+    def scalars(self, *args, **kwargs):
+        return self.call_with_fallback(super().scalars, *args, **kwargs)
@@ -1,8 +1,128 @@
 from sqlmodel import create_engine, SQLModel
+from sqlalchemy import JSON, Column, Table, event, inspect, text
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool, ConnectionPoolEntry
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from app.core.config import config
+from app.core.log import logger
+from app.core.metrics import (
+    SQL_QUERY_DURATION,
+    SQL_POOL_CHECKOUT_WAIT,
+    SQL_POOL_CHECKED_OUT,
+    SQL_POOL_OVERFLOW,
+    SQL_POOL_SIZE,
+    SQL_POOL_TIMEOUTS,
+)
+import time
 
 
-sqlalchemy_engine = create_engine(config.database_url)
+class InstrumentedQueuePool(QueuePool):
+    """
+    QueuePool that records how long checkouts wait for a connection, and exports
+    its occupancy labelled by `database`, which `create_sql_engine` sets.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.database = ""
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.set_database(self.database)
+        return pool
+
+    def set_database(self, database: str) -> None:
+        self.database = database
+        SQL_POOL_SIZE.labels(database).set(self.size())
+        return None
+
+    def update_metrics(self) -> None:
+        SQL_POOL_CHECKED_OUT.labels(self.database).set(self.checkedout())
+        SQL_POOL_OVERFLOW.labels(self.database).set(max(self.overflow(), 0))
+        return None
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        try:
+            super()._do_return_conn(record)
+        finally:
+            self.update_metrics()
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            SQL_POOL_TIMEOUTS.labels(self.database).inc()
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            SQL_POOL_CHECKOUT_WAIT.labels(self.database).observe(wait)
+            self.update_metrics()
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            if wait > config.database_pool_slow_checkout:
+                logger.warning(
+                    f"Slow connection checkout: waited {wait:.3f}s, "
+                    f"{self.checkedout()} checked out, overflow {self.overflow()}"
+                )
+
+    def status_dict(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "max_overflow": self._max_overflow,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg": self.wait_total / self.checkouts if self.checkouts else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+
+# The start time is kept on the execution context rather than the connection, so
+# a statement that fails before after_cursor_execute leaves nothing behind
+@event.listens_for(Engine, "before_cursor_execute")
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_start_time = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "query_start_time", None)
+    if start is None:
+        return
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    SQL_QUERY_DURATION.labels(operation).observe(time.perf_counter() - start)
+
+
+def create_sql_engine(database_url: str) -> Engine:
+    url = make_url(database_url)
+    # In-memory SQLite databases live in a single connection and cannot be pooled
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return create_engine(url)
+    engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=config.database_pool_size,
+        max_overflow=config.database_max_overflow,
+        pool_timeout=config.database_pool_timeout,
+        pool_recycle=config.database_pool_recycle,
+        pool_pre_ping=config.database_pool_pre_ping,
+    )
+    engine.pool.set_database(url.render_as_string(hide_password=True))
+    return engine
+
+
+sqlalchemy_engine = create_sql_engine(config.database_url)
 
 
 def init_db():
@@ -22,5 +142,64 @@ def init_db():
     SQLModel.metadata.create_all(sqlalchemy_engine)
 
 
+def convert_json_column(table: Table, column: Column) -> None:
+    dialect = sqlalchemy_engine.dialect
+    table_name = dialect.identifier_preparer.format_table(table)
+    column_name = dialect.identifier_preparer.format_column(column)
+    if dialect.name == "postgresql":
+        statement = (
+            f"ALTER TABLE {table_name} ALTER COLUMN {column_name} "
+            f"TYPE JSON USING {column_name}::json"
+        )
+    elif dialect.name == "mysql":
+        statement = f"ALTER TABLE {table_name} MODIFY {column_name} JSON"
+    else:
+        # SQLite stores JSON as text, the existing values are read as is
+        return None
+    logger.info(f"Converting column {column.name} of {table.name} to JSON")
+    with sqlalchemy_engine.begin() as connection:
+        connection.execute(text(statement))
+    return None
+
+
+def upgrade_db():
+    """
+    Bring an existing database up to the current schema. `create_all` only creates
+    missing tables, so columns and indexes added to existing tables are created here,
+    and text columns that now hold JSON are converted.
+    """
+    init_db()
+    inspector = inspect(sqlalchemy_engine)
+    for table in SQLModel.metadata.sorted_tables:
+        columns = {
+            column["name"]: column for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            if column.name not in columns:
+                logger.info(f"Adding column {column.name} to {table.name}")
+                dialect = sqlalchemy_engine.dialect
+                table_name = dialect.identifier_preparer.format_table(table)
+                column_spec = CreateColumn(column).compile(dialect=dialect)
+                with sqlalchemy_engine.begin() as connection:
+                    connection.execute(
+                        text(f"ALTER TABLE {table_name} ADD COLUMN {column_spec}")
+                    )
+            elif isinstance(column.type, JSON) and not isinstance(
+                columns[column.name]["type"], JSON
+            ):
+                convert_json_column(table, column)
+        index_names = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in index_names:
+                logger.info(f"Creating index {index.name} on {table.name}")
+                index.create(sqlalchemy_engine)
+
+
 def drop_db():
     SQLModel.metadata.drop_all(sqlalchemy_engine)
+
+
+def get_pool_status(engine: Engine = sqlalchemy_engine) -> dict:
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        return engine.pool.status_dict()
+    return {}
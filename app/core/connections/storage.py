@@ -0,0 +1,21 @@
+from app.core.storages.base_storage import BaseStorage
+from app.core.storages.local import LocalStorage
+from app.core.config import config
+
+
+def create_storage() -> BaseStorage:
+    if config.storage_backend == "s3":
+        from app.core.storages.s3 import S3Storage
+
+        return S3Storage(
+            bucket=config.s3_bucket,
+            endpoint_url=config.s3_endpoint_url,
+            region=config.s3_region,
+            access_key=config.s3_access_key,
+            secret_key=config.s3_secret_key,
+            public_url=config.s3_public_url,
+        )
+    return LocalStorage(config.static_dir)
+
+
+storage = create_storage()
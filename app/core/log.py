@@ -1,8 +1,54 @@
 import sys
+import json
+import random
+import traceback
 import logging
-from types import FrameType
-from typing import Any, cast
+from typing import Any
 from loguru import logger
+from app.core.config import config
+
+STANDARD_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL")
+
+
+def get_levels() -> dict[str, str]:
+    """
+    Parse `log_levels` ("module=LEVEL,...") into a loguru filter, where a module
+    also covers its submodules.
+    """
+    levels = {"": config.log_level}
+    for item in config.log_levels.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def patch_record(record: dict[str, Any]) -> None:
+    # Records from the standard logging module carry their caller already
+    logging_record = record["extra"].pop("logging_record", None)
+    if logging_record is not None:
+        record["name"] = logging_record.name
+        record["function"] = logging_record.funcName
+        record["line"] = logging_record.lineno
+        record["module"] = logging_record.module
+
+
+def format_json(record: dict[str, Any]) -> str:
+    data = {
+        "time": record["time"].isoformat(),
+        "level": record["level"].name,
+        "name": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+    }
+    extra = {key: value for key, value in record["extra"].items() if key != "json"}
+    if extra:
+        data["extra"] = extra
+    if record["exception"] is not None:
+        data["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    record["extra"]["json"] = json.dumps(data, ensure_ascii=False, default=str)
+    return "{extra[json]}\n"
 
 
 class Log:
@@ -10,7 +56,13 @@ class Log:
     def __init__(self):
         self.logger = logger
         self.logger.remove()
-        self.logger.add(sys.stdout)
+        self.logger.configure(patcher=patch_record)
+        # Records are written by a background thread, so a slow stdout never
+        # blocks the event loop
+        options = {"format": format_json} if config.log_format == "json" else {}
+        self.logger.add(
+            sys.stdout, level=0, filter=get_levels(), enqueue=True, **options
+        )
 
     def init_config(self):
         LOGGER_NAMES = ("uvicorn.asgi", "uvicorn.access", "uvicorn")
@@ -20,23 +72,44 @@ class Log:
         for logger_name in LOGGER_NAMES:
             logging_logger = logging.getLogger(logger_name)
             logging_logger.handlers = [InterceptHandler()]
+        logging.getLogger("uvicorn.access").addFilter(AccessLogSampler())
+
+        # Let the logging module drop disabled records before they are built
+        for logger_name, level in get_levels().items():
+            if logger_name and level in STANDARD_LEVELS:
+                logging.getLogger(logger_name).setLevel(level)
+
+    async def complete(self):
+        # Wait for the background thread to write out the queued records
+        await self.logger.complete()
+
+
+class AccessLogSampler(logging.Filter):
+    """
+    Keep only a `log_access_sample_rate` share of successful access logs. Client
+    and server errors are always kept.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if config.log_access_sample_rate >= 1:
+            return True
+        # uvicorn passes (client, method, path, http version, status code)
+        if isinstance(record.args, tuple) and len(record.args) == 5:
+            if record.args[4] >= 400:
+                return True
+        return random.random() < config.log_access_sample_rate
 
 
 class InterceptHandler(logging.Handler):
     def emit(self, record: logging.LogRecord) -> None:  # pragma: no cover
         # Get corresponding Loguru level if it exists
-        try:
-            level = logger.level(record.levelname).name
-        except ValueError:
-            level = str(record.levelno)
-
-        # Find caller from where originated the logged message
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:  # noqa: WPS609
-            frame = cast(FrameType, frame.f_back)
-            depth += 1
-
-        logger.opt(depth=depth, exception=record.exc_info).log(
+        if record.levelname in STANDARD_LEVELS:
+            level = record.levelname
+        else:
+            level = record.levelno
+
+        # The caller is taken from the record instead of walking the stack
+        logger.bind(logging_record=record).opt(exception=record.exc_info).log(
             level,
             record.getMessage(),
         )
@@ -2,19 +2,88 @@ from sqlmodel import Session
 from app.models.credit import CreditRecord
 from app.models.user import User
 from app.core.connections.sql import sqlalchemy_engine
+from app.core.connections.redis import redis_client
+from app.core.managers.ledger import CreditLedger
+from app.core.managers.user import UserCache
+from app.core.config import config
+from app.core.log import logger
 from fastapi import HTTPException, status
+import asyncio
+import time
 
 
 class CreditNotEnough(HTTPException):
-    def __init__(self, user: User, amount: int):
+    def __init__(self, user: User, amount: int, credits_left: int = None):
         self.user = user
         self.amount = amount
+        if credits_left is None:
+            credits_left = user.credits_left
         super().__init__(
             status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail=f"User {user.username} has only {user.credits_left} credits left, not enough for {amount}",
+            detail=f"User {user.username} has only {credits_left} credits left, not enough for {amount}",
         )
 
 
+# Reserve credits for a task. The balance in the "credits" hash is seeded from
+# the database value on first use, afterwards Redis is the admission authority.
+# The reservation is indexed by its deadline so abandoned ones can be reaped.
+# KEYS: credits hash, reservation key, reservation deadlines sorted set
+# ARGV: user id, amount, seed balance, force (1 to skip balance check), deadline
+RESERVE_CREDIT_SCRIPT = redis_client.register_script(
+    """
+    local balance = redis.call('HGET', KEYS[1], ARGV[1])
+    if not balance then
+        balance = ARGV[3]
+        redis.call('HSET', KEYS[1], ARGV[1], balance)
+    end
+    balance = tonumber(balance)
+    local amount = tonumber(ARGV[2])
+    if ARGV[4] ~= '1' and balance < amount then
+        return {0, balance}
+    end
+    redis.call('HINCRBY', KEYS[1], ARGV[1], -amount)
+    redis.call('SET', KEYS[2], ARGV[1] .. ':' .. amount)
+    redis.call('ZADD', KEYS[3], ARGV[5], KEYS[2])
+    return {1, balance - amount}
+    """
+)
+
+# Settle a reservation with the actual cost and give back the remainder.
+# Returns the reserved amount, or nil if the reservation is already settled.
+# KEYS: credits hash, reservation key, reservation deadlines sorted set
+# ARGV: actual cost
+SETTLE_CREDIT_SCRIPT = redis_client.register_script(
+    """
+    redis.call('ZREM', KEYS[3], KEYS[2])
+    local reservation = redis.call('GET', KEYS[2])
+    if not reservation then
+        return nil
+    end
+    redis.call('DEL', KEYS[2])
+    local sep = string.find(reservation, ':')
+    local user_id = string.sub(reservation, 1, sep - 1)
+    local amount = tonumber(string.sub(reservation, sep + 1))
+    if redis.call('HEXISTS', KEYS[1], user_id) == 1 then
+        redis.call('HINCRBY', KEYS[1], user_id, amount - tonumber(ARGV[1]))
+    end
+    return amount
+    """
+)
+
+# Apply a balance change only if the balance is already cached, so a missing
+# entry is always seeded from the database instead of a partial delta.
+# KEYS: credits hash
+# ARGV: user id, delta
+INCREASE_CREDIT_SCRIPT = redis_client.register_script(
+    """
+    if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 then
+        return redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+    end
+    return nil
+    """
+)
+
+
 class CreditManager:
     @staticmethod
     def check_credit(user_id: int, amount: int) -> None:
@@ -24,16 +93,69 @@ class CreditManager:
             raise CreditNotEnough(user, amount)
         return None
 
+    @staticmethod
+    def reserve_credit(
+        user: User, task_id: str, amount: int, force: bool = False
+    ) -> int:
+        reserved, credits_left = RESERVE_CREDIT_SCRIPT(
+            keys=["credits", f"credit_reservation_{task_id}", "credit_reservations"],
+            args=[
+                user.id,
+                int(amount),
+                user.credits_left,
+                1 if force else 0,
+                time.time() + config.credit_reservation_timeout,
+            ],
+        )
+        if not reserved:
+            raise CreditNotEnough(user, amount, credits_left)
+        return credits_left
+
+    @staticmethod
+    def settle_credit(task_id: str, amount: int) -> int | None:
+        return SETTLE_CREDIT_SCRIPT(
+            keys=["credits", f"credit_reservation_{task_id}", "credit_reservations"],
+            args=[int(amount)],
+        )
+
+    @staticmethod
+    def release_credit(task_id: str) -> int | None:
+        return CreditManager.settle_credit(task_id, 0)
+
+    @staticmethod
+    def reap_reservations() -> int:
+        """
+        Give back reservations past their deadline, left behind by workers that
+        stopped before settling them.
+        """
+        reservation_keys = redis_client.zrangebyscore(
+            "credit_reservations", "-inf", time.time()
+        )
+        reaped = 0
+        for reservation_key in reservation_keys:
+            if (
+                SETTLE_CREDIT_SCRIPT(
+                    keys=["credits", reservation_key, "credit_reservations"], args=[0]
+                )
+                is not None
+            ):
+                reaped += 1
+        if reaped:
+            logger.warning(f"Released {reaped} expired credit reservations")
+        return reaped
+
+    @staticmethod
+    async def run_reaper_forever() -> None:
+        while True:
+            try:
+                await asyncio.to_thread(CreditManager.reap_reservations)
+            except Exception as e:
+                logger.error(f"Credit reservation reaping failed: {e}")
+            await asyncio.sleep(config.credit_reservation_reap_interval)
+
     @staticmethod
     def consume_credit(user_id: int, amount: int, description: str) -> None:
-        with Session(sqlalchemy_engine) as session:
-            user = session.get(User, user_id)
-            user.credits_left -= amount
-            credit = CreditRecord(
-                user_id=user.id, amount=-amount, description=f"Consume: {description}"
-            )
-            session.add(credit)
-            session.commit()
+        CreditLedger.push(user_id, -amount, f"Consume: {description}")
         return None
 
     @staticmethod
@@ -46,4 +168,6 @@ class CreditManager:
             )
             session.add(credit)
             session.commit()
+        UserCache.invalidate(user_id)
+        INCREASE_CREDIT_SCRIPT(keys=["credits"], args=[user_id, int(amount)])
         return None
@@ -0,0 +1,213 @@
+from sqlmodel import Session, select, insert, update, delete, not_
+from app.models.credit import CreditRecord, CreditLedgerEntry
+from app.models.user import User
+from app.core.connections.sql import sqlalchemy_engine
+from app.core.connections.redis import redis_client, RELEASE_LOCK_SCRIPT
+from app.core.managers.user import UserCache
+from app.core.config import config
+from app.core.log import logger
+from app.core.metrics import CREDIT_LEDGER_PENDING, CREDIT_LEDGER_LAG
+from collections import defaultdict
+from datetime import datetime, timedelta
+from uuid import uuid4
+import asyncio
+
+
+class CreditLedger:
+    """
+    Write-behind buffer for credit records. Records are appended to a Redis list
+    and flushed to the database in bulk, so they survive a restart of the worker.
+    Every entry carries a unique ledger id, so a batch replayed after a failed
+    trim is skipped instead of applied twice.
+    """
+
+    flush_event: asyncio.Event = None
+
+    @staticmethod
+    def push(user_id: int, amount: int, description: str) -> None:
+        record = CreditLedgerEntry(
+            user_id=user_id,
+            amount=amount,
+            description=description,
+            ledger_id=uuid4().hex,
+        )
+        length = redis_client.rpush("credit_ledger", record.model_dump_json())
+        if (
+            length >= config.credit_ledger_batch_size
+            and CreditLedger.flush_event is not None
+        ):
+            CreditLedger.flush_event.set()
+        return None
+
+    @staticmethod
+    def get_lag() -> tuple[int, float]:
+        """
+        Return the number of pending records and the age of the oldest one in seconds.
+        """
+        pending = redis_client.llen("credit_ledger")
+        oldest = redis_client.lindex("credit_ledger", 0)
+        if oldest is None:
+            return pending, 0.0
+        record = CreditLedgerEntry.model_validate_json(oldest)
+        return pending, (datetime.now() - record.create_time).total_seconds()
+
+    @staticmethod
+    def flush_batch(entries: list[str]) -> None:
+        records = [CreditLedgerEntry.model_validate_json(entry) for entry in entries]
+        with Session(sqlalchemy_engine) as session:
+            flushed_ids = set(
+                session.exec(
+                    select(CreditRecord.ledger_id).where(
+                        CreditRecord.ledger_id.in_(
+                            {record.ledger_id for record in records if record.ledger_id}
+                        )
+                    )
+                ).all()
+            )
+            if flushed_ids:
+                logger.warning(
+                    f"Credit ledger skipped {len(flushed_ids)} records already flushed"
+                )
+                records = [
+                    record for record in records if record.ledger_id not in flushed_ids
+                ]
+            user_ids = set(
+                session.exec(
+                    select(User.id).where(
+                        User.id.in_({record.user_id for record in records})
+                    )
+                ).all()
+            )
+            # Users deleted while their records were buffered would fail the whole batch
+            records = [record for record in records if record.user_id in user_ids]
+            if len(records) < len(entries) - len(flushed_ids):
+                logger.warning(
+                    f"Credit ledger dropped {len(entries) - len(flushed_ids) - len(records)} records of deleted users"
+                )
+            if records:
+                session.execute(
+                    insert(CreditRecord), [record.model_dump() for record in records]
+                )
+            deltas = defaultdict(int)
+            for record in records:
+                deltas[record.user_id] += record.amount
+            for user_id, delta in deltas.items():
+                session.execute(
+                    update(User)
+                    .where(User.id == user_id)
+                    .values(credits_left=User.credits_left + delta)
+                )
+            session.commit()
+        UserCache.invalidate(*deltas)
+
+    @staticmethod
+    def flush() -> int:
+        # Only one worker drains the buffer at a time
+        lock_owner = uuid4().hex
+        if not redis_client.set("credit_ledger_lock", lock_owner, nx=True, ex=60):
+            return 0
+        flushed = 0
+        try:
+            while True:
+                entries = redis_client.lrange(
+                    "credit_ledger", 0, config.credit_ledger_batch_size - 1
+                )
+                if not entries:
+                    break
+                CreditLedger.flush_batch(entries)
+                redis_client.ltrim("credit_ledger", len(entries), -1)
+                flushed += len(entries)
+                if len(entries) < config.credit_ledger_batch_size:
+                    break
+        finally:
+            RELEASE_LOCK_SCRIPT(keys=["credit_ledger_lock"], args=[lock_owner])
+        pending, lag = CreditLedger.get_lag()
+        CREDIT_LEDGER_PENDING.set(pending)
+        CREDIT_LEDGER_LAG.set(lag)
+        if flushed:
+            logger.debug(
+                f"Credit ledger flushed {flushed} records, {pending} pending, lag {lag:.1f}s"
+            )
+        return flushed
+
+    @staticmethod
+    async def run_forever() -> None:
+        CreditLedger.flush_event = asyncio.Event()
+        while True:
+            try:
+                await asyncio.to_thread(CreditLedger.flush)
+            except Exception as e:
+                logger.error(f"Credit ledger flush failed: {e}")
+            try:
+                await asyncio.wait_for(
+                    CreditLedger.flush_event.wait(),
+                    timeout=config.credit_ledger_flush_interval,
+                )
+            except asyncio.TimeoutError:
+                pass
+            CreditLedger.flush_event.clear()
+
+    @staticmethod
+    def compact(before: datetime) -> int:
+        """
+        Roll credit records older than `before` into one snapshot record per user and month.
+        """
+        compactable = (
+            CreditRecord.create_time < before,
+            not_(CreditRecord.description.startswith("Snapshot:")),
+        )
+        with Session(sqlalchemy_engine) as session:
+            user_ids = session.exec(
+                select(CreditRecord.user_id).where(*compactable).distinct()
+            ).all()
+
+        compacted = 0
+        for user_id in user_ids:
+            with Session(sqlalchemy_engine) as session:
+                records = session.exec(
+                    select(CreditRecord.amount, CreditRecord.create_time).where(
+                        CreditRecord.user_id == user_id, *compactable
+                    )
+                ).all()
+                periods = defaultdict(lambda: [0, 0])
+                for amount, create_time in records:
+                    period = create_time.replace(
+                        day=1, hour=0, minute=0, second=0, microsecond=0
+                    )
+                    periods[period][0] += amount
+                    periods[period][1] += 1
+                session.execute(
+                    delete(CreditRecord).where(
+                        CreditRecord.user_id == user_id, *compactable
+                    )
+                )
+                session.add_all(
+                    CreditRecord(
+                        user_id=user_id,
+                        amount=amount,
+                        description=f"Snapshot: {period:%Y-%m}, {count} records",
+                        create_time=period,
+                    )
+                    for period, (amount, count) in periods.items()
+                )
+                session.commit()
+            compacted += len(records)
+        logger.info(f"Credit ledger compacted {compacted} records")
+        return compacted
+
+    @staticmethod
+    async def run_compaction_forever() -> None:
+        while True:
+            # The lock is left to expire so only one worker compacts per interval
+            if redis_client.set(
+                "credit_compaction_lock",
+                1,
+                nx=True,
+                ex=config.credit_compaction_interval,
+            ):
+                before = datetime.now() - timedelta(days=config.credit_compaction_days)
+                try:
+                    await asyncio.to_thread(CreditLedger.compact, before)
+                except Exception as e:
+                    logger.error(f"Credit ledger compaction failed: {e}")
+            await asyncio.sleep(config.credit_compaction_interval)
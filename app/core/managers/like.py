@@ -0,0 +1,127 @@
+from sqlmodel import Session, select, update, func
+from app.models.chat import Chat
+from app.models.preset import Preset, PresetVisibility
+from app.models.like import PresetLikeRecord, ChatLikeRecord
+from app.core.connections.sql import sqlalchemy_engine
+from app.core.connections.redis import redis_client
+from uuid import UUID
+
+
+# Add a member only if the leaderboard is already built, otherwise the partial
+# set would hide the presets a rebuild would have loaded.
+# KEYS: leaderboard key
+# ARGV: score, member
+ADD_IF_EXISTS_SCRIPT = redis_client.register_script(
+    """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return redis.call('ZADD', KEYS[1], ARGV[1], ARGV[2])
+    end
+    return nil
+    """
+)
+
+
+class LikeManager:
+    """
+    Keeps the trending leaderboard of public presets, a Redis sorted set scored
+    by the denormalized `like_count` of each preset.
+    """
+
+    @staticmethod
+    def update_trending(preset: Preset) -> None:
+        if preset.visibility == PresetVisibility.public:
+            ADD_IF_EXISTS_SCRIPT(
+                keys=["trending_presets"], args=[preset.like_count, str(preset.id)]
+            )
+        else:
+            redis_client.zrem("trending_presets", str(preset.id))
+        return None
+
+    @staticmethod
+    def incr_trending(preset_id: str | UUID, delta: int) -> None:
+        # XX only touches existing members, i.e. public presets
+        redis_client.zadd(
+            "trending_presets", {str(preset_id): delta}, xx=True, incr=True
+        )
+        return None
+
+    @staticmethod
+    def incr_trending_batch(preset_ids: list[str | UUID], delta: int) -> None:
+        pipeline = redis_client.pipeline(transaction=False)
+        for preset_id in preset_ids:
+            pipeline.zadd(
+                "trending_presets", {str(preset_id): delta}, xx=True, incr=True
+            )
+        pipeline.execute()
+        return None
+
+    @staticmethod
+    def remove_trending(*preset_ids: str | UUID) -> None:
+        if preset_ids:
+            redis_client.zrem(
+                "trending_presets", *(str(preset_id) for preset_id in preset_ids)
+            )
+        return None
+
+    @staticmethod
+    def rebuild_trending() -> None:
+        with Session(sqlalchemy_engine) as session:
+            presets = session.exec(
+                select(Preset.id, Preset.like_count).where(
+                    Preset.visibility == PresetVisibility.public
+                )
+            ).all()
+        pipeline = redis_client.pipeline()
+        pipeline.delete("trending_presets")
+        # Keep an empty placeholder so an empty leaderboard still counts as built
+        pipeline.zadd("trending_presets", {"": float("-inf")})
+        if presets:
+            pipeline.zadd(
+                "trending_presets",
+                {str(preset_id): like_count for preset_id, like_count in presets},
+            )
+        pipeline.execute()
+        return None
+
+    @staticmethod
+    def get_trending_preset_ids(offset: int, limit: int) -> list[str]:
+        if not redis_client.exists("trending_presets"):
+            LikeManager.rebuild_trending()
+        preset_ids = redis_client.zrevrangebyscore(
+            "trending_presets", "+inf", "(-inf", start=offset, num=limit
+        )
+        return preset_ids
+
+    @staticmethod
+    def get_like_counts() -> dict[str, int]:
+        if not redis_client.exists("trending_presets"):
+            LikeManager.rebuild_trending()
+        return {
+            preset_id: int(like_count)
+            for preset_id, like_count in redis_client.zrangebyscore(
+                "trending_presets", "(-inf", "+inf", withscores=True
+            )
+        }
+
+    @staticmethod
+    def rebuild_like_counts() -> None:
+        with Session(sqlalchemy_engine) as session:
+            session.execute(
+                update(Preset).values(
+                    like_count=select(func.count())
+                    .where(PresetLikeRecord.preset_id == Preset.id)
+                    .scalar_subquery(),
+                    update_time=Preset.update_time,
+                )
+            )
+            session.execute(
+                update(Chat).values(
+                    like_count=select(func.count())
+                    .where(ChatLikeRecord.chat_id == Chat.id)
+                    .scalar_subquery(),
+                    update_time=Chat.update_time,
+                )
+            )
+            session.commit()
+        LikeManager.rebuild_trending()
+        return None
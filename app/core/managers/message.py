@@ -27,6 +27,14 @@ class MessageStorage:
             return Messages.model_validate_json(messages_str).root
         raise ValueError("Chat Messages not found")
 
+    @staticmethod
+    @uuid_to_str_wapper
+    def get_messages_size(chat_id: str | UUID) -> int:
+        """
+        Size in bytes of the stored messages, read without loading them.
+        """
+        return redis_client.hstrlen(f"messages", chat_id)
+
     @staticmethod
     @uuid_to_str_wapper
     def set_messages(chat_id: str | UUID, messages: list[Message]) -> None:
@@ -55,3 +63,9 @@ class MessageStorage:
     def delete_messages(chat_id: str | UUID) -> None:
         redis_client.hdel(f"messages", chat_id)
         return None
+
+    @staticmethod
+    def delete_messages_batch(chat_ids: list[str | UUID]) -> None:
+        if chat_ids:
+            redis_client.hdel(f"messages", *(str(chat_id) for chat_id in chat_ids))
+        return None
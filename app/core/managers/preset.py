@@ -0,0 +1,123 @@
+from sqlmodel import Session, select
+from pydantic import TypeAdapter
+from app.models.preset import Preset, PresetParameters, PresetRead, PresetVisibility
+from app.core.connections.sql import sqlalchemy_engine
+from app.core.connections.redis import redis_client
+from app.core.managers.message import MessageStorage
+from app.core.managers.like import LikeManager
+from app.core.config import config
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+from typing import Optional
+from uuid import UUID
+
+preset_catalog_adapter = TypeAdapter(list[PresetRead])
+
+
+class PresetParametersCache:
+    """
+    Per-process LRU cache of parsed preset parameters. Entries are keyed by the
+    preset id and its update time, so an updated preset is parsed again and the
+    stale entry is evicted as it ages out.
+    """
+
+    _cache: OrderedDict[tuple[str, datetime], PresetParameters] = OrderedDict()
+    _lock = Lock()
+
+    @staticmethod
+    def get_parameters(preset: Preset) -> PresetParameters:
+        key = (str(preset.id), preset.update_time)
+        with PresetParametersCache._lock:
+            parameters = PresetParametersCache._cache.get(key)
+            if parameters is not None:
+                PresetParametersCache._cache.move_to_end(key)
+                return parameters
+
+        parameters = PresetParameters.model_validate(preset.parameters)
+        if config.preset_parameters_cache_size > 0:
+            with PresetParametersCache._lock:
+                PresetParametersCache._cache[key] = parameters
+                while (
+                    len(PresetParametersCache._cache)
+                    > config.preset_parameters_cache_size
+                ):
+                    PresetParametersCache._cache.popitem(last=False)
+        return parameters
+
+    @staticmethod
+    def invalidate(preset_id: str | UUID) -> None:
+        preset_id = str(preset_id)
+        with PresetParametersCache._lock:
+            for key in [
+                key for key in PresetParametersCache._cache if key[0] == preset_id
+            ]:
+                del PresetParametersCache._cache[key]
+        return None
+
+
+class PresetCatalog:
+    """
+    Public presets, serialized once into Redis and kept parsed in each process.
+    Changing a public preset bumps the catalog version, which makes every process
+    load the new catalog on its next read. Like counts are taken from the trending
+    leaderboard so likes do not invalidate the catalog.
+    """
+
+    _version: Optional[str] = None
+    _presets: list[PresetRead] = []
+    _lock = Lock()
+
+    @staticmethod
+    def build() -> bytes:
+        with Session(sqlalchemy_engine) as session:
+            presets = session.exec(
+                select(Preset).where(Preset.visibility == PresetVisibility.public)
+            ).all()
+            catalog = [
+                {
+                    **preset.model_dump(exclude={"parameters"}),
+                    "messages": MessageStorage.get_messages(preset.id),
+                    "parameters": PresetParametersCache.get_parameters(preset),
+                }
+                for preset in presets
+            ]
+        return preset_catalog_adapter.dump_json(
+            preset_catalog_adapter.validate_python(catalog)
+        )
+
+    @staticmethod
+    def get_presets() -> list[PresetRead]:
+        version = redis_client.get("preset_catalog_version") or "0"
+        with PresetCatalog._lock:
+            if PresetCatalog._version == version:
+                presets = PresetCatalog._presets
+            else:
+                presets = None
+
+        if presets is None:
+            data = redis_client.get(f"preset_catalog_{version}")
+            if data is None:
+                data = PresetCatalog.build()
+                redis_client.set(
+                    f"preset_catalog_{version}", data, ex=config.preset_catalog_ttl
+                )
+            presets = preset_catalog_adapter.validate_json(data)
+            with PresetCatalog._lock:
+                PresetCatalog._version = version
+                PresetCatalog._presets = presets
+
+        # The cached presets are shared, copy the ones whose like count moved
+        like_counts = LikeManager.get_like_counts()
+        catalog = []
+        for preset in presets:
+            like_count = like_counts.get(str(preset.id), preset.like_count)
+            if like_count != preset.like_count:
+                preset = preset.model_copy(update={"like_count": like_count})
+            catalog.append(preset)
+        return catalog
+
+    @staticmethod
+    def invalidate() -> None:
+        redis_client.incr("preset_catalog_version")
+        return None
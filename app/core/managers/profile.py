@@ -0,0 +1,40 @@
+from app.core.connections.redis import redis_client
+from app.core.config import config
+from app.models.server import RequestProfile
+from fastapi import HTTPException, status
+
+
+class ProfileManager:
+    """
+    Request profiles are kept in Redis so every worker can serve them. The
+    newest `profiler_max_profiles` are listed in `profiles`, the HTML of each
+    expires after `profiler_retention` seconds.
+    """
+
+    @staticmethod
+    def save_profile(profile: RequestProfile, html: str) -> None:
+        pipeline = redis_client.pipeline()
+        pipeline.set(
+            f"profile_{profile.profile_id}", html, ex=config.profiler_retention
+        )
+        pipeline.lpush("profiles", profile.model_dump_json())
+        pipeline.ltrim("profiles", 0, config.profiler_max_profiles - 1)
+        pipeline.execute()
+        return None
+
+    @staticmethod
+    def list_profiles() -> list[RequestProfile]:
+        return [
+            RequestProfile.model_validate_json(profile)
+            for profile in redis_client.lrange("profiles", 0, -1)
+        ]
+
+    @staticmethod
+    def get_profile(profile_id: str) -> str:
+        html = redis_client.get(f"profile_{profile_id}")
+        if html is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Profile {profile_id} not found",
+            )
+        return html
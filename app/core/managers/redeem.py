@@ -1,6 +1,12 @@
 from app.core.connections.redis import redis_client
 from app.core.managers.credit import CreditManager
+from app.models.credit import RedeemCodeBatch
 from fastapi import HTTPException
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import uuid4
+import secrets
+import string
 
 
 class RedeemCodeNotFound(HTTPException):
@@ -9,12 +15,75 @@ class RedeemCodeNotFound(HTTPException):
         super().__init__(status_code=422, detail=f"Invalid redeem code: {code}")
 
 
+class RedeemCodeConflict(HTTPException):
+    def __init__(self, codes: list[str]):
+        self.codes = codes
+        super().__init__(
+            status_code=400,
+            detail={
+                "message": f"{len(codes)} redeem codes already belong to another batch",
+                "redeem_codes": codes[:100],
+            },
+        )
+
+
+class RedeemCodeBatchNotFound(HTTPException):
+    def __init__(self, batch_id: str):
+        self.batch_id = batch_id
+        super().__init__(
+            status_code=404, detail=f"Redeem code batch not found: {batch_id}"
+        )
+
+
+# Take a redeem code in one step so it can only be redeemed once. Codes created
+# before per-code keys were introduced are still read from the legacy hash.
+# Returns {1, value} when taken, {1} when not found, or {0} when the code no
+# longer belongs to the given batch and has to be looked up again.
+# KEYS: code key, legacy "redeem_codes" hash, batch key if the code has a batch
+# ARGV: code, batch id of the code or an empty string
+TAKE_REDEEM_CODE_SCRIPT = redis_client.register_script(
+    """
+    local value = redis.call('HGET', KEYS[1], 'value')
+    if value then
+        local batch_id = redis.call('HGET', KEYS[1], 'batch_id') or ''
+        if batch_id ~= ARGV[2] then
+            return {0}
+        end
+        redis.call('DEL', KEYS[1])
+        if batch_id ~= '' then
+            redis.call('HINCRBY', KEYS[3], 'redeemed', 1)
+        end
+        return {1, value}
+    end
+    value = redis.call('HGET', KEYS[2], ARGV[1])
+    if value then
+        redis.call('HDEL', KEYS[2], ARGV[1])
+        return {1, value}
+    end
+    return {1}
+    """
+)
+
+REDEEM_CODE_ALPHABET = "".join(
+    char for char in string.ascii_uppercase + string.digits if char not in "0O1IL"
+)
+# Map random bytes onto the alphabet, dropping the bytes above the largest
+# multiple of its length so every character is equally likely
+REDEEM_CODE_TABLE = bytes(
+    ord(REDEEM_CODE_ALPHABET[byte % len(REDEEM_CODE_ALPHABET)]) for byte in range(256)
+)
+REDEEM_CODE_REJECTED = bytes(range(256 - 256 % len(REDEEM_CODE_ALPHABET), 256))
+REDEEM_CODE_CHUNK_SIZE = 1000
+
+
 class RedeemManager:
 
     @staticmethod
     def check_redeem_code(code: str) -> int:
         code = code.upper()
-        value = redis_client.hget("redeem_codes", code)
+        value = redis_client.hget(f"redeem_code_{code}", "value")
+        if value is None:
+            value = redis_client.hget("redeem_codes", code)
         if value is None:
             raise RedeemCodeNotFound(code)
         return int(value)
@@ -22,19 +91,137 @@ class RedeemManager:
     @staticmethod
     def redeem_credit(user_id: int, code: str) -> int:
         code = code.upper()
-        value = RedeemManager.check_redeem_code(code)
-        RedeemManager.delete_redeem_code(code)
+        while True:
+            batch_id = redis_client.hget(f"redeem_code_{code}", "batch_id") or ""
+            keys = [f"redeem_code_{code}", "redeem_codes"]
+            if batch_id:
+                keys.append(f"redeem_batch_{batch_id}")
+            result = TAKE_REDEEM_CODE_SCRIPT(keys=keys, args=[code, batch_id])
+            if result[0]:
+                break
+        if len(result) < 2:
+            raise RedeemCodeNotFound(code)
+        value = int(result[1])
         CreditManager.add_credit(user_id, value, f"Redeem credit, code: {code}")
         return value
 
     @staticmethod
-    def add_redeem_code(code: str, value: int):
+    def add_redeem_code(code: str, value: int, expire_seconds: Optional[int] = None):
         code = code.upper()
-        redis_client.hset("redeem_codes", code, value)
+        # A code is never moved out of the batch it was created in
+        if redis_client.hget(f"redeem_code_{code}", "batch_id"):
+            raise RedeemCodeConflict([code])
+        pipeline = redis_client.pipeline()
+        pipeline.delete(f"redeem_code_{code}")
+        pipeline.hset(f"redeem_code_{code}", "value", value)
+        if expire_seconds:
+            pipeline.expire(f"redeem_code_{code}", expire_seconds)
+        # Drop the legacy entry so the code cannot be redeemed twice
+        pipeline.hdel("redeem_codes", code)
+        pipeline.execute()
         return value
 
     @staticmethod
     def delete_redeem_code(code: str):
         code = code.upper()
+        redis_client.delete(f"redeem_code_{code}")
         redis_client.hdel("redeem_codes", code)
         return code
+
+    @staticmethod
+    def generate_redeem_codes(count: int, length: int = 16) -> list[str]:
+        codes = set()
+        while len(codes) < count:
+            chars = secrets.token_bytes((count - len(codes) + 1) * length).translate(
+                REDEEM_CODE_TABLE, REDEEM_CODE_REJECTED
+            )
+            for start in range(0, len(chars) - length + 1, length):
+                codes.add(chars[start : start + length].decode())
+                if len(codes) >= count:
+                    break
+        return list(codes)
+
+    @staticmethod
+    def add_redeem_code_batch(
+        codes: list[str], value: int, expire_seconds: Optional[int] = None
+    ) -> RedeemCodeBatch:
+        codes = list(dict.fromkeys(code.upper() for code in codes))
+        create_time = datetime.now()
+        batch = RedeemCodeBatch(
+            batch_id=uuid4().hex,
+            value=value,
+            count=len(codes),
+            redeemed=0,
+            create_time=create_time,
+            expire_time=(
+                create_time + timedelta(seconds=expire_seconds)
+                if expire_seconds
+                else None
+            ),
+        )
+        batch_key = f"redeem_batch_{batch.batch_id}"
+        codes_key = f"redeem_batch_codes_{batch.batch_id}"
+
+        # A code is never moved out of the batch it was created in
+        conflicts = []
+        for start in range(0, len(codes), REDEEM_CODE_CHUNK_SIZE):
+            chunk = codes[start : start + REDEEM_CODE_CHUNK_SIZE]
+            pipeline = redis_client.pipeline(transaction=False)
+            for code in chunk:
+                pipeline.hget(f"redeem_code_{code}", "batch_id")
+            conflicts.extend(
+                code for code, batch_id in zip(chunk, pipeline.execute()) if batch_id
+            )
+        if conflicts:
+            raise RedeemCodeConflict(conflicts)
+
+        # Write codes in pipelined chunks, one round trip per chunk
+        for start in range(0, len(codes), REDEEM_CODE_CHUNK_SIZE):
+            chunk = codes[start : start + REDEEM_CODE_CHUNK_SIZE]
+            pipeline = redis_client.pipeline(transaction=False)
+            for code in chunk:
+                pipeline.delete(f"redeem_code_{code}")
+                pipeline.hset(
+                    f"redeem_code_{code}",
+                    mapping={"value": value, "batch_id": batch.batch_id},
+                )
+                if expire_seconds:
+                    pipeline.expire(f"redeem_code_{code}", expire_seconds)
+            pipeline.hdel("redeem_codes", *chunk)
+            pipeline.sadd(codes_key, *chunk)
+            pipeline.execute()
+
+        pipeline = redis_client.pipeline()
+        pipeline.hset(
+            batch_key,
+            mapping=batch.model_dump(
+                mode="json", exclude={"batch_id"}, exclude_none=True
+            ),
+        )
+        if expire_seconds:
+            pipeline.expire(batch_key, expire_seconds)
+            pipeline.expire(codes_key, expire_seconds)
+        pipeline.execute()
+        return batch
+
+    @staticmethod
+    def get_redeem_code_batch(batch_id: str) -> RedeemCodeBatch:
+        data = redis_client.hgetall(f"redeem_batch_{batch_id}")
+        if not data:
+            raise RedeemCodeBatchNotFound(batch_id)
+        return RedeemCodeBatch.model_validate({**data, "batch_id": batch_id})
+
+    @staticmethod
+    def delete_redeem_code_batch(batch_id: str) -> RedeemCodeBatch:
+        batch = RedeemManager.get_redeem_code_batch(batch_id)
+        codes_key = f"redeem_batch_codes_{batch_id}"
+        codes = []
+        for code in redis_client.sscan_iter(codes_key, count=REDEEM_CODE_CHUNK_SIZE):
+            codes.append(code)
+            if len(codes) >= REDEEM_CODE_CHUNK_SIZE:
+                redis_client.delete(*(f"redeem_code_{code}" for code in codes))
+                codes = []
+        if codes:
+            redis_client.delete(*(f"redeem_code_{code}" for code in codes))
+        redis_client.delete(codes_key, f"redeem_batch_{batch_id}")
+        return batch
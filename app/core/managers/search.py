@@ -0,0 +1,253 @@
+from sqlmodel import Session, select
+from app.models.chat import Chat
+from app.models.preset import Preset
+from app.core.connections.sql import sqlalchemy_engine
+from app.core.connections.redis import redis_client
+from app.core.config import config
+from app.core.pagination import apply_keyset_to_list, get_cursor_value
+from app.models.order import OrderBy, Order
+from sqlmodel import SQLModel
+from typing import Callable, Iterator, Optional, Sequence
+from uuid import UUID
+import hashlib
+import re
+
+# CJK ideographs, kana and hangul are indexed character by character, anything
+# else alphanumeric is indexed as words
+CJK_PATTERN = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+TOKEN_PATTERN = re.compile(rf"([{CJK_PATTERN}]+)|([^\W{CJK_PATTERN}]+)")
+
+SEARCH_CHUNK_SIZE = 500
+
+
+class SearchManager:
+    """
+    Inverted index of preset and chat titles in Redis. Every token maps to a
+    sorted set of document ids scored by creation time, so a search is the
+    intersection of the sets of its tokens and can be read newest or oldest first.
+
+    CJK text is indexed as unigrams and bigrams, and words as edge n-grams so a
+    query matches any word it is a prefix of.
+    """
+
+    @staticmethod
+    def tokenize(text: str) -> set[str]:
+        tokens = set()
+        for cjk, word in TOKEN_PATTERN.findall(text.lower()):
+            if cjk:
+                tokens.update(cjk)
+                tokens.update(cjk[i : i + 2] for i in range(len(cjk) - 1))
+            else:
+                word = word[: config.search_max_prefix_length]
+                tokens.update(word[:i] for i in range(1, len(word) + 1))
+        return tokens
+
+    @staticmethod
+    def tokenize_query(query: str) -> set[str]:
+        tokens = set()
+        for cjk, word in TOKEN_PATTERN.findall(query.lower()):
+            if len(cjk) == 1:
+                tokens.add(cjk)
+            elif cjk:
+                tokens.update(cjk[i : i + 2] for i in range(len(cjk) - 1))
+            else:
+                tokens.add(word[: config.search_max_prefix_length])
+        return tokens
+
+    @staticmethod
+    def index_document(
+        kind: str, namespace: str, doc_id: str, text: str, score: float
+    ) -> None:
+        tokens_key = f"search_tokens_{kind}_{doc_id}"
+        index_keys = {
+            f"search_postings_{namespace}_{token}"
+            for token in SearchManager.tokenize(text)
+        }
+        old_index_keys = redis_client.smembers(tokens_key)
+
+        pipeline = redis_client.pipeline()
+        for index_key in old_index_keys - index_keys:
+            pipeline.zrem(index_key, doc_id)
+        for index_key in index_keys:
+            pipeline.zadd(index_key, {doc_id: score})
+        pipeline.delete(tokens_key)
+        if index_keys:
+            pipeline.sadd(tokens_key, *index_keys)
+        pipeline.execute()
+        return None
+
+    @staticmethod
+    def remove_documents(kind: str, doc_ids: list[str]) -> None:
+        if not doc_ids:
+            return None
+        pipeline = redis_client.pipeline(transaction=False)
+        for doc_id in doc_ids:
+            pipeline.smembers(f"search_tokens_{kind}_{doc_id}")
+        index_keys_list = pipeline.execute()
+
+        pipeline = redis_client.pipeline()
+        for doc_id, index_keys in zip(doc_ids, index_keys_list):
+            for index_key in index_keys:
+                pipeline.zrem(index_key, doc_id)
+            pipeline.delete(f"search_tokens_{kind}_{doc_id}")
+        pipeline.execute()
+        return None
+
+    @staticmethod
+    def search(namespace: str, query: str) -> Optional[str]:
+        """
+        Intersect the postings of the query tokens in Redis and return the key of
+        the resulting sorted set, which is kept briefly for the following pages.
+        """
+        tokens = sorted(SearchManager.tokenize_query(query))
+        if not tokens:
+            return None
+        index_keys = [f"search_postings_{namespace}_{token}" for token in tokens]
+        if len(index_keys) == 1:
+            return index_keys[0]
+        digest = hashlib.sha1(" ".join(tokens).encode("utf-8")).hexdigest()
+        result_key = f"search_result_{namespace}_{digest}"
+        if not redis_client.exists(result_key):
+            pipeline = redis_client.pipeline()
+            pipeline.zinterstore(result_key, index_keys, aggregate="MAX")
+            pipeline.expire(result_key, config.search_result_ttl)
+            pipeline.execute()
+        return result_key
+
+    @staticmethod
+    def iter_results(
+        result_key: str, descending: bool, score_bound: Optional[float] = None
+    ) -> Iterator[list[UUID]]:
+        """
+        Read search results in chunks, newest or oldest first, starting from
+        `score_bound` if given.
+        """
+        start = 0
+        while True:
+            if descending:
+                doc_ids = redis_client.zrevrangebyscore(
+                    result_key,
+                    "+inf" if score_bound is None else score_bound,
+                    "-inf",
+                    start=start,
+                    num=SEARCH_CHUNK_SIZE,
+                )
+            else:
+                doc_ids = redis_client.zrangebyscore(
+                    result_key,
+                    "-inf" if score_bound is None else score_bound,
+                    "+inf",
+                    start=start,
+                    num=SEARCH_CHUNK_SIZE,
+                )
+            if not doc_ids:
+                return
+            yield [UUID(doc_id) for doc_id in doc_ids]
+            if len(doc_ids) < SEARCH_CHUNK_SIZE:
+                return
+            start += len(doc_ids)
+
+    @staticmethod
+    def paginate(
+        result_key: Optional[str],
+        fetch: Callable[[list[UUID], int], Sequence[SQLModel]],
+        model: type[SQLModel],
+        order_by: OrderBy,
+        order: Order,
+        offset: int,
+        limit: int,
+        cursor: Optional[str] = None,
+    ) -> list:
+        """
+        Return one page of search results. Results are passed to `fetch` one chunk
+        of ids at a time along with the number of rows wanted, and it returns the
+        rows the caller may see in the requested order.
+
+        Ordered by creation time, chunks are read in that order and the scan stops
+        once the page is filled. Other orders rank the newest
+        `search_max_results` matches.
+        """
+        if result_key is None:
+            return []
+        wanted = offset + limit
+        by_create_time = order_by == OrderBy.CREATE_TIME
+        score_bound = None
+        if by_create_time and cursor is not None:
+            score_bound = get_cursor_value(cursor, model, order_by, order).timestamp()
+        items = []
+        scanned = 0
+        for doc_ids in SearchManager.iter_results(
+            result_key, order == Order.DESC or not by_create_time, score_bound
+        ):
+            items.extend(fetch(doc_ids, wanted))
+            scanned += len(doc_ids)
+            if by_create_time:
+                if len(items) >= wanted:
+                    break
+            else:
+                items = apply_keyset_to_list(items, model, order_by, order)[:wanted]
+                if scanned >= config.search_max_results:
+                    break
+        items = apply_keyset_to_list(items, model, order_by, order)
+        return items[offset:wanted]
+
+    @staticmethod
+    def index_preset(preset: Preset) -> None:
+        text = f"{preset.title} {preset.description or ''}"
+        SearchManager.index_document(
+            "preset", "preset", str(preset.id), text, preset.create_time.timestamp()
+        )
+        return None
+
+    @staticmethod
+    def remove_preset(*preset_ids: str | UUID) -> None:
+        SearchManager.remove_documents(
+            "preset", [str(preset_id) for preset_id in preset_ids]
+        )
+        return None
+
+    @staticmethod
+    def search_presets(query: str) -> Optional[str]:
+        return SearchManager.search("preset", query)
+
+    @staticmethod
+    def index_chat(chat: Chat) -> None:
+        SearchManager.index_document(
+            "chat",
+            f"chat_{chat.owner_id}",
+            str(chat.id),
+            chat.title,
+            chat.create_time.timestamp(),
+        )
+        return None
+
+    @staticmethod
+    def remove_chat(*chat_ids: str | UUID) -> None:
+        SearchManager.remove_documents("chat", [str(chat_id) for chat_id in chat_ids])
+        return None
+
+    @staticmethod
+    def search_chats(owner_id: int, query: str) -> Optional[str]:
+        return SearchManager.search(f"chat_{owner_id}", query)
+
+    @staticmethod
+    def rebuild_index() -> None:
+        keys = []
+        for key in redis_client.scan_iter("search_*", count=SEARCH_CHUNK_SIZE):
+            keys.append(key)
+            if len(keys) >= SEARCH_CHUNK_SIZE:
+                redis_client.delete(*keys)
+                keys = []
+        if keys:
+            redis_client.delete(*keys)
+
+        with Session(sqlalchemy_engine) as session:
+            for preset in session.exec(
+                select(Preset).execution_options(yield_per=SEARCH_CHUNK_SIZE)
+            ):
+                SearchManager.index_preset(preset)
+            for chat in session.exec(
+                select(Chat).execution_options(yield_per=SEARCH_CHUNK_SIZE)
+            ):
+                SearchManager.index_chat(chat)
+        return None
@@ -1,45 +1,348 @@
+from fastapi import FastAPI, HTTPException, UploadFile, status
+from fastapi.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+from app.models.user import AvatarSize
 from app.core.config import config
-from fastapi import FastAPI
+from app.core.connections.redis import redis_client
+from app.core.connections.storage import storage
+from app.core.storages.base_storage import HASHED_NAME_PATTERN
+from app.core.storages.local import LocalStorage
+from app.core.managers.user import LocalCache
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from PIL import Image
 from io import BytesIO
+from typing import Optional
+import asyncio
 import hashlib
 import os
+import time
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = f"public, max-age={config.static_cache_max_age}, immutable"
+IMAGE_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+
+
+def process_avatar(file_bytes: bytes, size: tuple[int, int]) -> bytes:
+    """
+    Thumbnail an image to WebP. Runs in the image process pool.
+    """
+    with BytesIO(file_bytes) as file:
+        image = Image.open(file)
+        # Let JPEG decode at a reduced scale instead of decoding every pixel
+        image.draft(image.mode, size)
+        image.thumbnail(size)
+        image_bytes = BytesIO()
+        image.save(image_bytes, format="WEBP")
+    return image_bytes.getvalue()
+
+
+def process_image(
+    file_bytes: bytes, preview_size: tuple[int, int]
+) -> tuple[str, bytes]:
+    """
+    Check an uploaded image and make its WebP preview. Runs in the image process
+    pool. Return the image format and the preview.
+    """
+    with BytesIO(file_bytes) as file:
+        image = Image.open(file)
+        image_format = image.format
+        image.draft(image.mode, preview_size)
+        image.thumbnail(preview_size)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        image_bytes = BytesIO()
+        image.save(image_bytes, format="WEBP", quality=80)
+    return image_format, image_bytes.getvalue()
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    Static files whose names are content hashes never change, so they are served
+    with a far-future immutable Cache-Control and the hash as their ETag.
+    Paths are looked up in the sharded layout of the local storage first.
+
+    With `static_offload_mode` set, only the headers are produced here and the
+    reverse proxy is told where the file is, so it sends the bytes itself.
+    """
+
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        full_path, stat_result = super().lookup_path(LocalStorage.shard_key(path))
+        if stat_result is None:
+            return super().lookup_path(path)
+        return full_path, stat_result
+
+    def file_response(
+        self,
+        full_path: str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        response = FileResponse(
+            full_path, status_code=status_code, stat_result=stat_result
+        )
+        match = HASHED_NAME_PATTERN.fullmatch(os.path.basename(full_path))
+        if match is not None:
+            response.headers["etag"] = f'"{match.group(1)}"'
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        if config.static_offload_mode != "none":
+            return self.offload_response(full_path, response)
+        return response
+
+    def offload_response(self, full_path: str, response: FileResponse) -> Response:
+        headers = {
+            key: value
+            for key, value in response.headers.items()
+            if key not in ("content-length", "accept-ranges")
+        }
+        if config.static_offload_mode == "x-accel-redirect":
+            relative_path = os.path.relpath(full_path, self.directory)
+            headers["x-accel-redirect"] = (
+                f"{config.static_offload_location.rstrip('/')}/{relative_path}"
+            )
+        else:
+            headers["x-sendfile"] = os.path.abspath(full_path)
+        return Response(status_code=response.status_code, headers=headers)
+
+
+async def redirect_static_file(key: str) -> RedirectResponse:
+    """
+    Serve static paths from a remote storage backend by redirecting to it.
+    """
+    response = RedirectResponse(storage.get_url(key))
+    if HASHED_NAME_PATTERN.fullmatch(key.rpartition("/")[2]) is not None:
+        response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+    return response
 
 
 class StaticFilesManager:
+    """
+    Files are stored through the configured storage backend and referred to by
+    their static URL (`/static/<key>`), which `get_url` resolves to the URL of
+    the backend.
+    """
+
+    image_executor: Optional[ProcessPoolExecutor] = None
+    # Content-addressed files never change, so a file seen once is assumed to stay
+    known_keys = LocalCache(10000)
 
     @staticmethod
     def init_static_files(app: FastAPI) -> None:
-        app.mount(
-            config.static_url, StaticFiles(directory=config.static_dir), name="static"
-        )
+        if isinstance(storage, LocalStorage):
+            app.mount(
+                config.static_url,
+                ImmutableStaticFiles(directory=config.static_dir),
+                name="static",
+            )
+        else:
+            app.add_api_route(
+                f"{config.static_url}/{{key:path}}",
+                redirect_static_file,
+                include_in_schema=False,
+            )
+
+    @staticmethod
+    def get_key(url: str) -> str:
+        return url.removeprefix(f"{config.static_url}/")
+
+    @staticmethod
+    def get_url(url: str) -> str:
+        """
+        Resolve a stored static URL to the absolute URL of the file.
+        """
+        if url.startswith(f"{config.static_url}/"):
+            return storage.get_url(StaticFilesManager.get_key(url))
+        return f"{config.api_base_url}{url}"
+
+    @staticmethod
+    def exists(key: str) -> bool:
+        if StaticFilesManager.known_keys.get(key):
+            return True
+        if not storage.exists(key):
+            return False
+        StaticFilesManager.known_keys.set(key, True, time.time() + 3600)
+        return True
+
+    @staticmethod
+    def write(key: str, data: bytes) -> None:
+        if not StaticFilesManager.exists(key):
+            storage.write(key, data)
+            StaticFilesManager.known_keys.set(key, True, time.time() + 3600)
+        return None
 
     @staticmethod
     def save_static_file(file_bytes: bytes) -> str:
         file_hash = hashlib.sha256(file_bytes).hexdigest()
-        file_path = f"{config.static_dir}/{file_hash}"
-        with open(file_path, "wb") as file:
-            file.write(file_bytes)
+        StaticFilesManager.write(file_hash, file_bytes)
         return f"{config.static_url}/{file_hash}"
 
     @staticmethod
     def remove_static_file(file_hash: str) -> None:
-        file_path = f"{config.static_dir}/{file_hash}"
+        storage.delete(file_hash)
+        StaticFilesManager.known_keys.delete(file_hash)
+
+    @staticmethod
+    async def read_upload(upload: UploadFile, max_size: int) -> tuple[bytes, str]:
+        """
+        Read an upload in chunks, rejecting it as soon as it exceeds `max_size`.
+        Return the content and its SHA-256 hash.
+        """
+        if upload.size is not None and upload.size > max_size:
+            raise HTTPException(
+                status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                detail="File too large",
+            )
+        file_hash = hashlib.sha256()
+        file_bytes = BytesIO()
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            if file_bytes.tell() + len(chunk) > max_size:
+                raise HTTPException(
+                    status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                    detail="File too large",
+                )
+            file_hash.update(chunk)
+            file_bytes.write(chunk)
+        return file_bytes.getvalue(), file_hash.hexdigest()
+
+    @staticmethod
+    def get_image_executor() -> ProcessPoolExecutor:
+        # Created on first use so every server worker gets its own pool, spawned
+        # rather than forked because the worker already runs threads
+        if StaticFilesManager.image_executor is None:
+            StaticFilesManager.image_executor = ProcessPoolExecutor(
+                max_workers=config.avatar_process_workers,
+                mp_context=get_context("spawn"),
+            )
+        return StaticFilesManager.image_executor
+
+    @staticmethod
+    async def save_avatar_file(
+        upload: UploadFile,
+        size: tuple[int, int] = (AvatarSize.large.value, AvatarSize.large.value),
+    ) -> str:
+        """
+        Save an uploaded avatar as a WebP thumbnail and return its URL. An upload
+        seen before is mapped to its existing avatar without decoding it again.
+        """
+        file_bytes, source_hash = await StaticFilesManager.read_upload(
+            upload, config.avatar_max_upload_size
+        )
+        source_key = f"{source_hash}_{size[0]}x{size[1]}"
+        avatar_url = redis_client.hget("avatar_sources", source_key)
+        if avatar_url is not None and await asyncio.to_thread(
+            StaticFilesManager.exists, StaticFilesManager.get_key(avatar_url)
+        ):
+            return avatar_url
+
+        loop = asyncio.get_running_loop()
+        try:
+            image_bytes = await loop.run_in_executor(
+                StaticFilesManager.get_image_executor(),
+                process_avatar,
+                file_bytes,
+                size,
+            )
+        except (OSError, Image.DecompressionBombError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image file"
+            )
+        file_hash = hashlib.sha256(image_bytes).hexdigest()
+        key = f"avatars/{file_hash}.webp"
+        await asyncio.to_thread(StaticFilesManager.write, key, image_bytes)
+        avatar_url = f"{config.static_url}/{key}"
+        redis_client.hset("avatar_sources", source_key, avatar_url)
+        return avatar_url
+
+    @staticmethod
+    async def save_image_file(upload: UploadFile) -> tuple[str, str]:
+        """
+        Save an uploaded image under its content hash along with a compressed
+        preview, and return the URLs of both.
+        """
+        file_bytes, file_hash = await StaticFilesManager.read_upload(
+            upload, config.chat_image_max_upload_size
+        )
+        preview_key = f"images/{file_hash}_{config.chat_image_preview_size}.webp"
+        extension = redis_client.hget("image_extensions", file_hash)
+        # The preview is checked too, it is missing after the preview size changed
+        # or a write failed halfway, and then made again below
+        if (
+            extension is not None
+            and await asyncio.to_thread(
+                StaticFilesManager.exists, f"images/{file_hash}.{extension}"
+            )
+            and await asyncio.to_thread(StaticFilesManager.exists, preview_key)
+        ):
+            return (
+                f"{config.static_url}/images/{file_hash}.{extension}",
+                f"{config.static_url}/{preview_key}",
+            )
+
+        loop = asyncio.get_running_loop()
         try:
-            os.remove(file_path)
+            image_format, preview_bytes = await loop.run_in_executor(
+                StaticFilesManager.get_image_executor(),
+                process_image,
+                file_bytes,
+                (config.chat_image_preview_size, config.chat_image_preview_size),
+            )
+        except (OSError, Image.DecompressionBombError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image file"
+            )
+        extension = IMAGE_EXTENSIONS.get(image_format)
+        if extension is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Unsupported image format",
+            )
+        image_key = f"images/{file_hash}.{extension}"
+        await asyncio.to_thread(StaticFilesManager.write, image_key, file_bytes)
+        await asyncio.to_thread(StaticFilesManager.write, preview_key, preview_bytes)
+        redis_client.hset("image_extensions", file_hash, extension)
+        return f"{config.static_url}/{image_key}", f"{config.static_url}/{preview_key}"
+
+    @staticmethod
+    async def get_avatar_variant(avatar_url: str, size: AvatarSize) -> str:
+        """
+        Return the URL of an avatar scaled down to `size`, generating the variant
+        on first request. Avatars are stored at the largest size, which is
+        returned as is.
+        """
+        if size == AvatarSize.large:
+            return avatar_url
+        stem, extension = os.path.splitext(avatar_url)
+        variant_url = f"{stem}_{size.value}{extension}"
+        variant_key = StaticFilesManager.get_key(variant_url)
+        if await asyncio.to_thread(StaticFilesManager.exists, variant_key):
+            return variant_url
+
+        try:
+            file_bytes = await asyncio.to_thread(
+                storage.read, StaticFilesManager.get_key(avatar_url)
+            )
         except FileNotFoundError:
-            pass
-
-    @staticmethod
-    def save_avatar_file(file_bytes: bytes, size: tuple[int, int] = (128, 128)) -> str:
-        with BytesIO(file_bytes) as file:
-            image = Image.open(file)
-            image.thumbnail(size)
-            image_bytes = BytesIO()
-            image.save(image_bytes, format="WEBP")
-        file_hash = hashlib.sha256(image_bytes.getvalue()).hexdigest()
-        file_path = f"{config.static_dir}/avatars/{file_hash}.webp"
-        with open(file_path, "wb") as file:
-            file.write(image_bytes.getvalue())
-        return f"{config.static_url}/avatars/{file_hash}.webp"
+            return avatar_url
+        loop = asyncio.get_running_loop()
+        image_bytes = await loop.run_in_executor(
+            StaticFilesManager.get_image_executor(),
+            process_avatar,
+            file_bytes,
+            (size.value, size.value),
+        )
+        await asyncio.to_thread(StaticFilesManager.write, variant_key, image_bytes)
+        return variant_url
+
+    @staticmethod
+    def shutdown() -> None:
+        if StaticFilesManager.image_executor is not None:
+            StaticFilesManager.image_executor.shutdown(cancel_futures=True)
+            StaticFilesManager.image_executor = None
+        return None
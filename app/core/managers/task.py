@@ -1,5 +1,6 @@
 from app.core.connections.redis import redis_client
-from app.models.task import Task, TaskStatus
+from app.core.config import config
+from app.models.task import Task, TaskStatus, TaskTrace
 from fastapi import HTTPException, status
 
 
@@ -14,7 +15,12 @@ class TaskManager:
                 detail=f"Task {task_id} not found",
             )
         task_status = TaskStatus(status_str)
-        return Task(task_id=task_id, status=task_status)
+        progress = redis_client.get(f"task_progress_{task_id}")
+        return Task(
+            task_id=task_id,
+            status=task_status,
+            progress=float(progress) if progress is not None else None,
+        )
 
     @staticmethod
     def set_task(task_id: str, status: TaskStatus) -> None:
@@ -22,7 +28,33 @@ class TaskManager:
         redis_client.expire(f"task_{task_id}", 3600)
         return None
 
+    @staticmethod
+    def set_progress(task_id: str, progress: float) -> None:
+        redis_client.set(f"task_progress_{task_id}", progress, ex=3600)
+        return None
+
     @staticmethod
     def delete_task(task_id: str) -> None:
-        redis_client.delete(f"task_{task_id}")
+        redis_client.delete(
+            f"task_{task_id}", f"task_progress_{task_id}", f"task_trace_{task_id}"
+        )
+        return None
+
+    @staticmethod
+    def get_trace(task_id: str) -> TaskTrace:
+        trace_json = redis_client.get(f"task_trace_{task_id}")
+        if trace_json is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Trace of task {task_id} not found",
+            )
+        return TaskTrace.model_validate_json(trace_json)
+
+    @staticmethod
+    def set_trace(trace: TaskTrace) -> None:
+        redis_client.set(
+            f"task_trace_{trace.task_id}",
+            trace.model_dump_json(),
+            ex=config.task_trace_retention,
+        )
         return None
@@ -0,0 +1,129 @@
+from app.models.user import User
+from app.models.security import TokenPayload
+from app.core.connections.redis import redis_client
+from app.core.config import config
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Optional
+import time
+
+# Secrets are never cached, routes that need them load the user from the database
+USER_CACHE_EXCLUDE = {"password_hash", "wechat_session_key"}
+
+# Cache a user only if it was not invalidated since it was read, so a stale row
+# read before a change cannot be cached after the change dropped it.
+# KEYS: user key, user version key
+# ARGV: version seen before the read, user JSON, ttl
+SET_USER_SCRIPT = redis_client.register_script(
+    """
+    if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+        return 0
+    end
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+    """
+)
+
+
+class LocalCache:
+    """
+    Small thread-safe LRU cache whose entries expire at a given time.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key: Any) -> Any:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expire_time, value = entry
+            if expire_time <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: Any, value: Any, expire_time: float) -> None:
+        if self.max_size <= 0:
+            return None
+        with self.lock:
+            self.entries[key] = (expire_time, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return None
+
+    def delete(self, key: Any) -> None:
+        with self.lock:
+            self.entries.pop(key, None)
+        return None
+
+
+class UserCache:
+    """
+    Authenticated users cached in each process for a few seconds, in front of a
+    Redis copy that is dropped whenever the user changes. Verified access tokens
+    are memoized until they expire, so most requests skip both JWT decoding and SQL.
+
+    Cached users are detached from any session, relationships must be queried.
+    """
+
+    users = LocalCache(config.user_cache_size)
+    tokens = LocalCache(config.user_token_cache_size)
+
+    @staticmethod
+    def get_user(user_id: int) -> Optional[User]:
+        user = UserCache.users.get(user_id)
+        if user is not None:
+            return user
+        user_str = redis_client.get(f"user_{user_id}")
+        if user_str is None:
+            return None
+        user = User.model_validate_json(user_str)
+        UserCache.users.set(user_id, user, time.time() + config.user_cache_local_ttl)
+        return user
+
+    @staticmethod
+    def get_version(user_id: int) -> str:
+        """
+        Read before loading a user from the database and pass to `set_user`.
+        """
+        return redis_client.get(f"user_version_{user_id}") or ""
+
+    @staticmethod
+    def set_user(user: User, version: str) -> None:
+        SET_USER_SCRIPT(
+            keys=[f"user_{user.id}", f"user_version_{user.id}"],
+            args=[
+                version,
+                user.model_dump_json(exclude=USER_CACHE_EXCLUDE),
+                config.user_cache_ttl,
+            ],
+        )
+        return None
+
+    @staticmethod
+    def invalidate(*user_ids: int) -> None:
+        if user_ids:
+            pipeline = redis_client.pipeline()
+            pipeline.delete(*(f"user_{user_id}" for user_id in user_ids))
+            for user_id in user_ids:
+                pipeline.incr(f"user_version_{user_id}")
+                pipeline.expire(f"user_version_{user_id}", config.user_cache_ttl)
+            pipeline.execute()
+        for user_id in user_ids:
+            UserCache.users.delete(user_id)
+        return None
+
+    @staticmethod
+    def get_token(token: str) -> Optional[TokenPayload]:
+        return UserCache.tokens.get(token)
+
+    @staticmethod
+    def set_token(token: str, token_data: TokenPayload, expire_time: float) -> None:
+        UserCache.tokens.set(token, token_data, expire_time)
+        return None
@@ -0,0 +1,218 @@
+from app.core.config import config
+import os
+import time
+
+# prometheus_client picks its value storage on import, so multiprocess mode has
+# to be switched on before the first import
+if config.metrics_multiproc_dir:
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", config.metrics_multiproc_dir)
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from fastapi import FastAPI, Request, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests being handled",
+    multiprocess_mode="livesum",
+)
+TASKS_IN_PROGRESS = Gauge(
+    "tasks_in_progress",
+    "Background tasks running",
+    ["type"],
+    multiprocess_mode="livesum",
+)
+TASK_DURATION = Histogram(
+    "task_duration_seconds",
+    "Background task duration",
+    ["type"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+PROVIDER_TIME_TO_FIRST_TOKEN = Histogram(
+    "provider_time_to_first_token_seconds",
+    "Time from sending a generation request to the first streamed chunk",
+    ["provider", "model"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30),
+)
+PROVIDER_TOKENS_PER_SECOND = Histogram(
+    "provider_tokens_per_second",
+    "Tokens billed per second of generation",
+    ["provider", "model"],
+    buckets=(1, 5, 10, 20, 30, 50, 75, 100, 150, 200, 500),
+)
+PROVIDER_REQUESTS = Counter(
+    "provider_requests_total",
+    "Generation requests sent to providers",
+    ["provider", "model", "status"],
+)
+RABBITMQ_PUBLISH_DURATION = Histogram(
+    "rabbitmq_publish_duration_seconds",
+    "RabbitMQ publish latency",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Redis command latency",
+    ["command"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+SQL_QUERY_DURATION = Histogram(
+    "sql_query_duration_seconds",
+    "SQL statement latency",
+    ["operation"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+SQL_POOL_CHECKOUT_WAIT = Histogram(
+    "sql_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled database connection",
+    ["database"],
+    buckets=(0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30),
+)
+SQL_POOL_SIZE = Gauge(
+    "sql_pool_size",
+    "Connections a database pool keeps open",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+SQL_POOL_CHECKED_OUT = Gauge(
+    "sql_pool_checked_out",
+    "Pooled database connections in use",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+SQL_POOL_OVERFLOW = Gauge(
+    "sql_pool_overflow",
+    "Database connections open beyond the pool size",
+    ["database"],
+    multiprocess_mode="livesum",
+)
+SQL_POOL_TIMEOUTS = Counter(
+    "sql_pool_timeouts_total",
+    "Checkouts that gave up waiting for a pooled database connection",
+    ["database"],
+)
+CREDIT_LEDGER_PENDING = Gauge(
+    "credit_ledger_pending",
+    "Credit records waiting to be written to the database",
+    multiprocess_mode="mostrecent",
+)
+CREDIT_LEDGER_LAG = Gauge(
+    "credit_ledger_lag_seconds",
+    "Age of the oldest credit record waiting to be written",
+    multiprocess_mode="mostrecent",
+)
+PASSWORD_HASH_QUEUED = Gauge(
+    "password_hash_queued",
+    "Password hashing jobs waiting for a worker thread",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_RUNNING = Gauge(
+    "password_hash_running",
+    "Password hashing jobs running",
+    multiprocess_mode="livesum",
+)
+PASSWORD_HASH_REJECTED = Counter(
+    "password_hash_rejected_total",
+    "Password hashing jobs rejected because the queue was full",
+)
+PASSWORD_HASH_WAIT = Histogram(
+    "password_hash_wait_seconds",
+    "Time password hashing jobs wait for a worker thread",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+SSE_CONNECTIONS = Gauge(
+    "sse_connections",
+    "Open task streaming connections",
+    multiprocess_mode="livesum",
+)
+
+
+class MetricsMiddleware:
+    """
+    Record the latency of every HTTP request, labelled by its route template so
+    path parameters do not create a series per id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], self.get_route(scope), status_code
+            ).observe(time.perf_counter() - start)
+
+    @staticmethod
+    def get_route(scope: Scope) -> str:
+        route = scope.get("route")
+        if route is None:
+            # Mounted apps like the static files only leave their mount path
+            if "endpoint" in scope and scope.get("root_path"):
+                return f"{scope['root_path']}/{{path}}"
+            return "unmatched"
+        path = scope["path"]
+        if route.path_regex.match(path):
+            return route.path_format
+        # Routes of included routers only know their own part of the path, the
+        # segments before it are the static prefixes the routers were included at
+        segments = path.split("/")
+        prefix = "/".join(segments[: len(segments) - route.path_format.count("/")])
+        return f"{prefix}{route.path_format}"
+
+
+async def metrics(request: Request) -> Response:
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Every worker writes its own files, aggregate them on each scrape
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app: FastAPI) -> None:
+    if not config.metrics_enabled:
+        return None
+    app.add_middleware(MetricsMiddleware)
+    app.add_api_route("/metrics", metrics, include_in_schema=False)
+    return None
+
+
+def mark_process_dead() -> None:
+    """
+    Drop the live gauges of this worker when it exits.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+    return None
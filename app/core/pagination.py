@@ -0,0 +1,127 @@
+from fastapi import HTTPException, status
+from sqlmodel import SQLModel, or_, and_, asc, desc
+from sqlmodel.sql.expression import SelectOfScalar
+from app.models.order import OrderBy, Order
+from typing import Any, Callable, Optional, Sequence
+from datetime import datetime
+import binascii
+import base64
+import json
+
+
+def encode_cursor(*values: Any) -> str:
+    data = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, *loaders: Callable[[Any], Any]) -> list:
+    """
+    Decode a cursor created by `encode_cursor`, converting each value with the loader at the same position.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(loaders):
+            raise ValueError("Cursor length mismatch")
+        return [loader(value) for loader, value in zip(loaders, values)]
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+def _column_loader(column) -> Callable[[Any], Any]:
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return str
+    if python_type is datetime:
+        return datetime.fromisoformat
+    return python_type
+
+
+def _decode_keyset_cursor(
+    cursor: str, model: type[SQLModel], order_by: OrderBy, order: Order
+) -> tuple[Any, Any]:
+    column = getattr(model, order_by.value)
+    cursor_order_by, cursor_order, value, last_id = decode_cursor(
+        cursor, OrderBy, Order, _column_loader(column), _column_loader(model.id)
+    )
+    if cursor_order_by != order_by or cursor_order != order:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor: The cursor was created with a different order",
+        )
+    return value, last_id
+
+
+def get_cursor_value(
+    cursor: str, model: type[SQLModel], order_by: OrderBy, order: Order
+) -> Any:
+    """
+    Return the value of the ordering column of the row a cursor was created from.
+    """
+    return _decode_keyset_cursor(cursor, model, order_by, order)[0]
+
+
+def apply_keyset(
+    statement: SelectOfScalar,
+    model: type[SQLModel],
+    order_by: OrderBy,
+    order: Order,
+    cursor: Optional[str] = None,
+) -> SelectOfScalar:
+    """
+    Order the statement by the given column with the id as tie-breaker and, if a cursor
+    is given, keep only the rows after the one the cursor was created from.
+    """
+    column = getattr(model, order_by.value)
+    if order == Order.ASC:
+        statement = statement.order_by(asc(column), asc(model.id))
+    else:
+        statement = statement.order_by(desc(column), desc(model.id))
+    if cursor is None:
+        return statement
+
+    value, last_id = _decode_keyset_cursor(cursor, model, order_by, order)
+    if order == Order.ASC:
+        return statement.where(
+            or_(column > value, and_(column == value, model.id > last_id))
+        )
+    return statement.where(
+        or_(column < value, and_(column == value, model.id < last_id))
+    )
+
+
+def apply_keyset_to_list(
+    items: Sequence[SQLModel],
+    model: type[SQLModel],
+    order_by: OrderBy,
+    order: Order,
+    cursor: Optional[str] = None,
+) -> list:
+    """
+    In-memory counterpart of `apply_keyset` for items that are already loaded.
+    """
+
+    def key(item):
+        return getattr(item, order_by.value), item.id
+
+    items = sorted(items, key=key, reverse=order == Order.DESC)
+    if cursor is None:
+        return items
+
+    last_key = _decode_keyset_cursor(cursor, model, order_by, order)
+    if order == Order.ASC:
+        return [item for item in items if key(item) > last_key]
+    return [item for item in items if key(item) < last_key]
+
+
+def get_next_cursor(
+    items: Sequence[SQLModel], order_by: OrderBy, order: Order, limit: int
+) -> Optional[str]:
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(
+        order_by.value, order.value, getattr(last, order_by.value), last.id
+    )
@@ -0,0 +1,88 @@
+from app.core.config import config
+from app.core.connections.sql import sqlalchemy_engine
+from app.core.managers.profile import ProfileManager
+from app.models.server import RequestProfile
+from app.api.deps import get_current_user
+from fastapi import FastAPI, HTTPException
+from sqlmodel import Session
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from datetime import datetime
+from uuid import uuid4
+import asyncio
+import random
+import time
+
+
+class ProfilerMiddleware:
+    """
+    Profile single requests with pyinstrument. A request is profiled when an
+    admin sends the `X-Profile` header or the `profile` query parameter, or at
+    random with probability `profiler_sample_rate`. The id of the stored profile
+    is returned in the `X-Profile-Id` response header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        from pyinstrument import Profiler
+
+        self.app = app
+        self.profiler_class = Profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not await self.should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid4().hex
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Profile-Id", profile_id)
+            await send(message)
+
+        profiler = self.profiler_class(
+            interval=config.profiler_interval, async_mode="enabled"
+        )
+        start = time.time()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profiler.stop()
+            profile = RequestProfile(
+                profile_id=profile_id,
+                method=scope["method"],
+                path=scope["path"],
+                duration=time.time() - start,
+                create_time=datetime.fromtimestamp(start),
+            )
+            # Rendering walks the whole call tree, keep it off the event loop
+            html = await asyncio.to_thread(profiler.output_html)
+            await asyncio.to_thread(ProfileManager.save_profile, profile, html)
+
+    @staticmethod
+    async def should_profile(scope: Scope) -> bool:
+        if random.random() < config.profiler_sample_rate:
+            return True
+        headers = Headers(scope=scope)
+        if "x-profile" not in headers and "profile" not in QueryParams(
+            scope["query_string"]
+        ):
+            return False
+        # Requested profiles are only taken for admins
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            return False
+        try:
+            with Session(sqlalchemy_engine) as session:
+                user = await get_current_user(session, token)
+        except HTTPException:
+            return False
+        return user.permission >= 2
+
+
+def init_profiler(app: FastAPI) -> None:
+    if not config.profiler_enabled:
+        return None
+    app.add_middleware(ProfilerMiddleware)
+    return None
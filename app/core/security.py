@@ -1,10 +1,27 @@
 from datetime import datetime, timedelta
-from typing import Any
+from typing import Any, Callable, Optional
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from fastapi import HTTPException, status
 from jose import jwt
 from passlib.context import CryptContext
 from app.core.config import config
+from app.core.metrics import (
+    PASSWORD_HASH_QUEUED,
+    PASSWORD_HASH_REJECTED,
+    PASSWORD_HASH_RUNNING,
+    PASSWORD_HASH_WAIT,
+)
+import asyncio
+import time
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with fewer rounds than configured are flagged by `verify_and_update`
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=config.password_bcrypt_rounds,
+    bcrypt__min_rounds=config.password_bcrypt_rounds,
+)
 
 
 def create_token(
@@ -26,3 +43,111 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+class PasswordHasherBusy(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again later",
+        )
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated thread pool so hashing never blocks the event loop.
+    Jobs beyond the workers wait in a bounded queue, and are rejected once the
+    queue is full instead of piling up behind a burst of logins. Queue length,
+    rejections and waits are exported to Prometheus.
+    """
+
+    executor = ThreadPoolExecutor(
+        max_workers=config.password_hash_workers, thread_name_prefix="password_hash"
+    )
+    lock = Lock()
+    queued = 0
+    running = 0
+    completed = 0
+    rejected = 0
+    wait_total = 0.0
+    wait_max = 0.0
+
+    @staticmethod
+    async def run(func: Callable, *args) -> Any:
+        with PasswordHasher.lock:
+            if PasswordHasher.queued >= config.password_hash_max_queue:
+                PasswordHasher.rejected += 1
+                PASSWORD_HASH_REJECTED.inc()
+                raise PasswordHasherBusy()
+            PasswordHasher.queued += 1
+            PASSWORD_HASH_QUEUED.inc()
+        submit_time = time.perf_counter()
+
+        def job():
+            wait = time.perf_counter() - submit_time
+            with PasswordHasher.lock:
+                PasswordHasher.queued -= 1
+                PasswordHasher.running += 1
+                PasswordHasher.wait_total += wait
+                PasswordHasher.wait_max = max(PasswordHasher.wait_max, wait)
+                PASSWORD_HASH_QUEUED.dec()
+                PASSWORD_HASH_RUNNING.inc()
+            PASSWORD_HASH_WAIT.observe(wait)
+            try:
+                return func(*args)
+            finally:
+                with PasswordHasher.lock:
+                    PasswordHasher.running -= 1
+                    PasswordHasher.completed += 1
+                    PASSWORD_HASH_RUNNING.dec()
+
+        future = PasswordHasher.executor.submit(job)
+        future.add_done_callback(PasswordHasher.on_job_done)
+        # Cancelling the caller cancels the job too if it has not started yet
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    def on_job_done(future: Future) -> None:
+        # A job cancelled while queued never runs, so it leaves the queue here
+        if future.cancelled():
+            with PasswordHasher.lock:
+                PasswordHasher.queued -= 1
+                PASSWORD_HASH_QUEUED.dec()
+        return None
+
+    @staticmethod
+    def status_dict() -> dict:
+        with PasswordHasher.lock:
+            return {
+                "workers": config.password_hash_workers,
+                "max_queue": config.password_hash_max_queue,
+                "queued": PasswordHasher.queued,
+                "running": PasswordHasher.running,
+                "completed": PasswordHasher.completed,
+                "rejected": PasswordHasher.rejected,
+                "wait_avg": (
+                    PasswordHasher.wait_total / PasswordHasher.completed
+                    if PasswordHasher.completed
+                    else 0.0
+                ),
+                "wait_max": PasswordHasher.wait_max,
+            }
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await PasswordHasher.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await PasswordHasher.run(get_password_hash, password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, Optional[str]]:
+    """
+    Verify a password and, if its hash uses outdated settings, return a new hash.
+    """
+    return await PasswordHasher.run(
+        pwd_context.verify_and_update, plain_password, hashed_password
+    )
@@ -0,0 +1,36 @@
+import re
+
+# Content-addressed file names, optionally with a size suffix for image variants
+HASHED_NAME_PATTERN = re.compile(r"([0-9a-f]{64}(?:_\d+)?)(?:\.\w+)?")
+
+
+class BaseStorage:
+    """
+    Object storage addressed by keys such as `avatars/<hash>.webp`.
+    Keys are relative to the static URL, so `/static/<key>` keeps working as the
+    public path of a file whatever backend stores it.
+    """
+
+    def __init__(self):
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def read(self, key: str) -> bytes:
+        """
+        Read a file, raising FileNotFoundError if it does not exist.
+        """
+        raise NotImplementedError
+
+    def write(self, key: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def get_url(self, key: str) -> str:
+        """
+        Return the absolute URL clients should fetch the file from.
+        """
+        raise NotImplementedError
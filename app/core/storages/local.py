@@ -0,0 +1,64 @@
+from app.core.storages.base_storage import BaseStorage, HASHED_NAME_PATTERN
+from app.core.config import config
+from uuid import uuid4
+import os
+
+
+class LocalStorage(BaseStorage):
+    """
+    Files on the local disk under `static_dir`. Content-addressed files are
+    sharded by the first two bytes of their hash (`avatars/ab/cd/abcd...webp`)
+    so no directory grows to millions of entries. Files written before sharding
+    are still found at their flat path.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    @staticmethod
+    def shard_key(key: str) -> str:
+        directory, _, name = key.rpartition("/")
+        if HASHED_NAME_PATTERN.fullmatch(name) is None:
+            return key
+        sharded = f"{name[:2]}/{name[2:4]}/{name}"
+        return f"{directory}/{sharded}" if directory else sharded
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.directory, self.shard_key(key))
+
+    def find_path(self, key: str) -> str | None:
+        for path in (self.get_path(key), os.path.join(self.directory, key)):
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def exists(self, key: str) -> bool:
+        return self.find_path(key) is not None
+
+    def read(self, key: str) -> bytes:
+        path = self.find_path(key)
+        if path is None:
+            raise FileNotFoundError(key)
+        with open(path, "rb") as file:
+            return file.read()
+
+    def write(self, key: str, data: bytes) -> None:
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so a concurrent reader never sees a partial file
+        temp_path = f"{path}.{uuid4().hex}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+        return None
+
+    def delete(self, key: str) -> None:
+        for path in (self.get_path(key), os.path.join(self.directory, key)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return None
+
+    def get_url(self, key: str) -> str:
+        return f"{config.api_base_url}{config.static_url}/{key}"
@@ -0,0 +1,78 @@
+from app.core.storages.base_storage import BaseStorage, HASHED_NAME_PATTERN
+from app.core.config import config
+import mimetypes
+
+
+class S3Storage(BaseStorage):
+    """
+    Files in an S3-compatible bucket (AWS S3, MinIO, OSS, COS...), so that every
+    API node sees the same files without a shared disk. Requires `boto3`.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: str = "",
+        region: str = "",
+        access_key: str = "",
+        secret_key: str = "",
+        public_url: str = "",
+    ):
+        try:
+            import boto3
+        except ImportError:
+            raise ImportError("The S3 storage backend requires boto3 to be installed")
+        from botocore.exceptions import ClientError
+
+        self.client_error = ClientError
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region or None,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+        )
+        if public_url:
+            self.public_url = public_url.rstrip("/")
+        elif endpoint_url:
+            self.public_url = f"{endpoint_url.rstrip('/')}/{bucket}"
+        else:
+            self.public_url = f"https://{bucket}.s3.amazonaws.com"
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except self.client_error as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise e
+        return True
+
+    def read(self, key: str) -> bytes:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+        except self.client_error as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(key)
+            raise e
+        return response["Body"].read()
+
+    def write(self, key: str, data: bytes) -> None:
+        extra_args = {}
+        content_type, _ = mimetypes.guess_type(key)
+        if content_type is not None:
+            extra_args["ContentType"] = content_type
+        if HASHED_NAME_PATTERN.fullmatch(key.rpartition("/")[2]) is not None:
+            extra_args["CacheControl"] = (
+                f"public, max-age={config.static_cache_max_age}, immutable"
+            )
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **extra_args)
+        return None
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return None
+
+    def get_url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
@@ -1,6 +1,7 @@
 from typing import AsyncIterator
 from app.core.connections.rabbitmq import get_rabbitmq_connection
 from app.core.connections.redis import redis_client
+from app.core.metrics import SSE_CONNECTIONS
 from app.models.task import TaskStream, TaskStatus
 from aio_pika.abc import (
     AbstractQueueIterator,
@@ -48,17 +49,18 @@ class TaskStreaming:
         redis_client.hdel("streaming_locks", self.task_id)
 
     async def iterator(self) -> AsyncIterator:
-        async with self:
-            yield "event: open\n\n"
-            async for message in self.iter:
-                async with message.process():
-                    if message.body:
-                        task_stream = TaskStream.model_validate_json(message.body)
-                        yield f"data: {task_stream.model_dump_json()}\n\n"
-                        await asyncio.sleep(0.2)
-                        if (
-                            task_stream.status == TaskStatus.finished
-                            or task_stream.status == TaskStatus.failed
-                        ):
-                            break
-            yield "event: close\n\n"
+        with SSE_CONNECTIONS.track_inprogress():
+            async with self:
+                yield "event: open\n\n"
+                async for message in self.iter:
+                    async with message.process():
+                        if message.body:
+                            task_stream = TaskStream.model_validate_json(message.body)
+                            yield f"data: {task_stream.model_dump_json()}\n\n"
+                            await asyncio.sleep(0.2)
+                            if (
+                                task_stream.status == TaskStatus.finished
+                                or task_stream.status == TaskStatus.failed
+                            ):
+                                break
+                yield "event: close\n\n"
@@ -1,18 +1,56 @@
 from app.models.task import TaskStatus, TaskFinish
+from app.models.chat import Chat
 from app.core.managers.task import TaskManager
+from app.core.managers.credit import CreditManager
+from app.core.managers.message import MessageStorage
+from app.core.metrics import TASKS_IN_PROGRESS, TASK_DURATION
+from app.core.tracing import TaskTracer
+from app.core.config import config
 from uuid import uuid4
+import time
 
 class BaseTask:
     task_id: str
+    tracer: TaskTracer
 
     def __init__(self) -> None:
         self.task_id = str(uuid4())
+        self.tracer = TaskTracer(self.task_id, type(self).__name__)
+
+    def estimate_credit_cost(self, chat: Chat) -> int:
+        raise NotImplementedError
+
+    @staticmethod
+    def estimate_prompt_tokens(chat: Chat) -> int:
+        # The whole chat and preset are sent as the prompt, sized from their JSON
+        size = MessageStorage.get_messages_size(chat.id)
+        size += MessageStorage.get_messages_size(chat.preset_id)
+        return int(size / config.credit_prompt_bytes_per_token)
 
     async def run(self, *args, **kwargs):
+        task_type = type(self).__name__
+        start = time.perf_counter()
+        self.tracer.add_span("queue", self.tracer.start_time)
+        TASKS_IN_PROGRESS.labels(task_type).inc()
+        try:
+            await self.generate(*args, **kwargs)
+        finally:
+            TASKS_IN_PROGRESS.labels(task_type).dec()
+            TASK_DURATION.labels(task_type).observe(time.perf_counter() - start)
+            # Give back whatever is still reserved if the task never settled
+            CreditManager.release_credit(self.task_id)
+            trace = self.tracer.get_trace()
+            TaskManager.set_trace(trace)
+            if config.task_trace_otel_enabled:
+                self.tracer.export(trace)
+
+    async def generate(self, *args, **kwargs):
         raise NotImplementedError
     
     async def on_status(self, status: TaskStatus):
         TaskManager.set_task(self.task_id, status)
+        if status == TaskStatus.failed:
+            CreditManager.release_credit(self.task_id)
 
     async def on_finish(self, task_finish: TaskFinish):
         TaskManager.set_task(self.task_id, TaskStatus.finished)
@@ -3,12 +3,18 @@ from app.core.connections.sql import sqlalchemy_engine
 from app.core.managers.task import TaskManager
 from app.core.managers.credit import CreditManager
 from app.core.managers.message import MessageStorage
+from app.core.managers.preset import PresetParametersCache
 from app.core.managers.client import ChatGenerationClientManager
 from app.core.tasks.base_task import BaseTask
 from app.core.config import config
+from app.core.metrics import (
+    PROVIDER_REQUESTS,
+    PROVIDER_TIME_TO_FIRST_TOKEN,
+    PROVIDER_TOKENS_PER_SECOND,
+    RABBITMQ_PUBLISH_DURATION,
+)
 from app.models.task import TaskStatus, TaskFinish, TaskStream
 from app.models.chat import Chat
-from app.models.preset import PresetParameters
 from app.models.message import Message, MessageRole, MessageType
 from aio_pika.abc import (
     AbstractChannel,
@@ -16,7 +22,9 @@ from aio_pika.abc import (
     AbstractQueue,
 )
 from sqlmodel import Session
+from typing import Optional
 import aio_pika
+import time
 
 
 class ChatGenerationTask(BaseTask):
@@ -26,9 +34,14 @@ class ChatGenerationTask(BaseTask):
     exchange: AbstractExchange
     channel: AbstractChannel
     queue: AbstractQueue
+    provider: str = ""
+    model: str = ""
+    request_time: float = 0.0
+    first_token_time: Optional[float] = None
 
     async def __aenter__(self):
-        await self.init_rabbitmq()
+        with self.tracer.span("rabbitmq_setup"):
+            await self.init_rabbitmq()
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
@@ -49,59 +62,99 @@ class ChatGenerationTask(BaseTask):
         await self.queue.unbind(self.exchange, routing_key=f"streaming_{self.task_id}")
         await self.channel.close()
 
-    async def on_finish(self, task_finish: TaskFinish):
-        await super().on_finish(task_finish)
+    async def publish(self, body: str):
+        start = time.perf_counter()
         await self.exchange.publish(
-            aio_pika.Message(
-                body=task_finish.model_dump_json().encode(encoding="utf-8")
-            ),
+            aio_pika.Message(body=body.encode(encoding="utf-8")),
             routing_key=f"streaming_{self.task_id}",
         )
-        CreditManager.consume_credit(
-            user_id=self.user_id,
-            amount=task_finish.token_cost * self.token_cost_multiplier,
-            description=f"Chat generation, chat_id: {self.chat_id}, task_id: {self.task_id}",
-        )
-        MessageStorage.add_message(
-            self.chat_id,
-            Message(
-                role=MessageRole.assistant,
-                type=MessageType.text,
-                content=task_finish.content,
-            ),
-        )
+        RABBITMQ_PUBLISH_DURATION.observe(time.perf_counter() - start)
+
+    async def on_status(self, status: TaskStatus):
+        await super().on_status(status)
+        if status == TaskStatus.failed:
+            PROVIDER_REQUESTS.labels(self.provider, self.model, "failed").inc()
+            if self.request_time:
+                self.tracer.add_span("failed", self.request_time)
+
+    async def on_finish(self, task_finish: TaskFinish):
+        finish_time = time.time()
+        PROVIDER_REQUESTS.labels(self.provider, self.model, "finished").inc()
+        # Without streaming the whole response arrives as the first token
+        if self.first_token_time is None:
+            PROVIDER_TIME_TO_FIRST_TOKEN.labels(self.provider, self.model).observe(
+                finish_time - self.request_time
+            )
+            self.tracer.add_span("first_token", self.request_time, finish_time)
+        else:
+            self.tracer.add_span("streaming", self.first_token_time, finish_time)
+        generation_time = finish_time - self.request_time
+        if generation_time > 0:
+            PROVIDER_TOKENS_PER_SECOND.labels(self.provider, self.model).observe(
+                task_finish.token_cost / generation_time
+            )
+        with self.tracer.span("finish"):
+            await super().on_finish(task_finish)
+            await self.publish(task_finish.model_dump_json())
+            token_cost = int(task_finish.token_cost * self.token_cost_multiplier)
+            CreditManager.settle_credit(self.task_id, token_cost)
+            CreditManager.consume_credit(
+                user_id=self.user_id,
+                amount=token_cost,
+                description=f"Chat generation, chat_id: {self.chat_id}, task_id: {self.task_id}",
+            )
+            MessageStorage.add_message(
+                self.chat_id,
+                Message(
+                    role=MessageRole.assistant,
+                    type=MessageType.text,
+                    content=task_finish.content,
+                ),
+            )
 
     async def on_stream(self, task_stream: TaskStream):
-        await self.exchange.publish(
-            aio_pika.Message(
-                body=task_stream.model_dump_json().encode(encoding="utf-8")
-            ),
-            routing_key=f"streaming_{self.task_id}",
-        )
+        if self.first_token_time is None:
+            self.first_token_time = time.time()
+            PROVIDER_TIME_TO_FIRST_TOKEN.labels(self.provider, self.model).observe(
+                self.first_token_time - self.request_time
+            )
+            self.tracer.add_span(
+                "first_token", self.request_time, self.first_token_time
+            )
+        await self.publish(task_stream.model_dump_json())
+
+    def estimate_credit_cost(self, chat: Chat) -> int:
+        preset_params = PresetParametersCache.get_parameters(chat.preset)
+        # Without a limit the provider may use up to its own default
+        max_tokens = preset_params.max_tokens or config.preset_default_max_tokens
+        tokens = self.estimate_prompt_tokens(chat) + max_tokens
+        return tokens * preset_params.get_token_cost_multiplier()
 
-    async def run(self, chat_id: str):
+    async def generate(self, chat_id: str):
         self.chat_id = chat_id
 
-        with Session(sqlalchemy_engine) as session:
-            chat = session.get(Chat, chat_id)
-            if chat is None:
-                raise ValueError("Chat not found")
-            self.user_id = chat.owner_id
-            preset_params = PresetParameters.model_validate_json(chat.preset.parameters)
+        with self.tracer.span("load_chat"):
+            with Session(sqlalchemy_engine) as session:
+                chat = session.get(Chat, chat_id)
+                if chat is None:
+                    raise ValueError("Chat not found")
+                self.user_id = chat.owner_id
+                preset_params = PresetParametersCache.get_parameters(chat.preset)
 
-        self.token_cost_multiplier = preset_params.get_token_cost_multiplier()
+            self.token_cost_multiplier = preset_params.get_token_cost_multiplier()
 
-        chat_messages = MessageStorage.get_messages(chat_id)
-        preset_messages = MessageStorage.get_messages(chat.preset_id)
-        messages = preset_messages + chat_messages
+            chat_messages = MessageStorage.get_messages(chat_id)
+            preset_messages = MessageStorage.get_messages(chat.preset_id)
+            messages = preset_messages + chat_messages
 
-        client = ChatGenerationClientManager.get_client(
-            preset_params.get_model_provider()
-        )
+        self.provider = preset_params.get_model_provider()
+        self.model = preset_params.model.value
+        client = ChatGenerationClientManager.get_client(self.provider)
 
         async with self:
             await self.on_status(TaskStatus.pending)
 
+            self.request_time = time.time()
             try:
                 await client.run_generate(
                     messages=messages,
@@ -3,6 +3,7 @@ from app.core.managers.message import MessageStorage
 from app.core.managers.task import TaskManager
 from app.core.managers.credit import CreditManager
 from app.core.managers.client import ChatGenerationClientManager
+from app.core.managers.search import SearchManager
 from app.core.tasks.base_task import BaseTask
 from app.models.chat import Chat
 from app.models.message import Message, MessageRole, MessageType
@@ -10,37 +11,50 @@ from app.models.preset import PresetParameters
 from app.models.task import TaskStatus, TaskFinish
 from app.core.config import config
 from sqlmodel import Session
+import time
 
 
 class TitleGenerationTask(BaseTask):
     chat_id: str
     user_id: int
+    max_tokens: int = 100
+    request_time: float = 0.0
 
     async def on_finish(self, task_finish: TaskFinish):
-        await super().on_finish(task_finish)
-        CreditManager.consume_credit(
-            user_id=self.user_id,
-            amount=task_finish.token_cost,
-            description=f"Title generation, chat_id: {self.chat_id}, task_id: {self.task_id}",
-        )
+        self.tracer.add_span("generation", self.request_time)
+        with self.tracer.span("finish"):
+            await super().on_finish(task_finish)
+            CreditManager.settle_credit(self.task_id, task_finish.token_cost)
+            CreditManager.consume_credit(
+                user_id=self.user_id,
+                amount=task_finish.token_cost,
+                description=f"Title generation, chat_id: {self.chat_id}, task_id: {self.task_id}",
+            )
+
+            with Session(sqlalchemy_engine) as session:
+                chat = session.get(Chat, self.chat_id)
+                chat.title = task_finish.content
+                session.add(chat)
+                session.commit()
+                session.refresh(chat)
+                SearchManager.index_chat(chat)
 
-        with Session(sqlalchemy_engine) as session:
-            chat = session.get(Chat, self.chat_id)
-            chat.title = task_finish.content
-            session.add(chat)
-            session.commit()
+    def estimate_credit_cost(self, chat: Chat) -> int:
+        # The whole chat is sent along with the title prompt and billed as well
+        return self.estimate_prompt_tokens(chat) + self.max_tokens
 
-    async def run(self, chat_id: str):
+    async def generate(self, chat_id: str):
         self.chat_id = chat_id
 
-        with Session(sqlalchemy_engine) as session:
-            chat = session.get(Chat, self.chat_id)
-            self.user_id = chat.owner_id
+        with self.tracer.span("load_chat"):
+            with Session(sqlalchemy_engine) as session:
+                chat = session.get(Chat, self.chat_id)
+                self.user_id = chat.owner_id
 
-        preset_params = PresetParameters(max_tokens=100)
+            chat_messages = MessageStorage.get_messages(self.chat_id)
+            preset_messages = MessageStorage.get_messages(chat.preset_id)
 
-        chat_messages = MessageStorage.get_messages(self.chat_id)
-        preset_messages = MessageStorage.get_messages(chat.preset_id)
+        preset_params = PresetParameters(max_tokens=self.max_tokens)
         question_message = Message(
             role=MessageRole.user,
             type=MessageType.text,
@@ -55,6 +69,7 @@ class TitleGenerationTask(BaseTask):
 
         await self.on_status(TaskStatus.pending)
 
+        self.request_time = time.time()
         await client.run_generate(
             messages=messages,
             preset_params=preset_params,
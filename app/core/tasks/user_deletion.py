@@ -0,0 +1,189 @@
+from app.core.connections.sql import sqlalchemy_engine
+from app.core.connections.redis import redis_client
+from app.core.managers.task import TaskManager
+from app.core.managers.message import MessageStorage
+from app.core.managers.like import LikeManager
+from app.core.managers.search import SearchManager
+from app.core.managers.user import UserCache
+from app.core.managers.preset import PresetParametersCache, PresetCatalog
+from app.core.tasks.base_task import BaseTask
+from app.core.config import config
+from app.core.log import logger
+from app.models.task import TaskStatus
+from app.models.user import User
+from app.models.chat import Chat
+from app.models.preset import Preset
+from app.models.credit import CreditRecord
+from app.models.like import PresetLikeRecord, ChatLikeRecord
+from sqlmodel import Session, select, update, delete, func, or_
+import asyncio
+
+
+class UserDeletionTask(BaseTask):
+    """
+    Delete a user and everything they own with batched bulk statements, instead
+    of loading every row through the ORM cascades, and purge the Redis entries
+    of the deleted chats and presets along the way.
+    """
+
+    user_id: int
+
+    def count_rows(self) -> int:
+        with Session(sqlalchemy_engine) as session:
+            return sum(
+                session.exec(select(func.count()).where(condition)).one()
+                for condition in (
+                    PresetLikeRecord.user_id == self.user_id,
+                    ChatLikeRecord.user_id == self.user_id,
+                    self.chat_condition(),
+                    Preset.owner_id == self.user_id,
+                    CreditRecord.user_id == self.user_id,
+                )
+            )
+
+    def chat_condition(self):
+        # Chats based on the user's presets go with them, as the ORM cascade did
+        return or_(
+            Chat.owner_id == self.user_id,
+            Chat.preset_id.in_(
+                select(Preset.id).where(Preset.owner_id == self.user_id)
+            ),
+        )
+
+    def delete_preset_likes(self) -> int:
+        with Session(sqlalchemy_engine) as session:
+            preset_ids = session.exec(
+                select(PresetLikeRecord.preset_id)
+                .where(PresetLikeRecord.user_id == self.user_id)
+                .limit(config.user_deletion_batch_size)
+            ).all()
+            if not preset_ids:
+                return 0
+            session.execute(
+                update(Preset)
+                .where(Preset.id.in_(preset_ids))
+                .values(
+                    like_count=Preset.like_count - 1, update_time=Preset.update_time
+                )
+            )
+            session.execute(
+                delete(PresetLikeRecord).where(
+                    PresetLikeRecord.user_id == self.user_id,
+                    PresetLikeRecord.preset_id.in_(preset_ids),
+                )
+            )
+            session.commit()
+        LikeManager.incr_trending_batch(preset_ids, -1)
+        return len(preset_ids)
+
+    def delete_chat_likes(self) -> int:
+        with Session(sqlalchemy_engine) as session:
+            chat_ids = session.exec(
+                select(ChatLikeRecord.chat_id)
+                .where(ChatLikeRecord.user_id == self.user_id)
+                .limit(config.user_deletion_batch_size)
+            ).all()
+            if not chat_ids:
+                return 0
+            session.execute(
+                update(Chat)
+                .where(Chat.id.in_(chat_ids))
+                .values(like_count=Chat.like_count - 1, update_time=Chat.update_time)
+            )
+            session.execute(
+                delete(ChatLikeRecord).where(
+                    ChatLikeRecord.user_id == self.user_id,
+                    ChatLikeRecord.chat_id.in_(chat_ids),
+                )
+            )
+            session.commit()
+        return len(chat_ids)
+
+    def delete_chats(self) -> int:
+        with Session(sqlalchemy_engine) as session:
+            chat_ids = session.exec(
+                select(Chat.id)
+                .where(self.chat_condition())
+                .limit(config.user_deletion_batch_size)
+            ).all()
+            if not chat_ids:
+                return 0
+            session.execute(
+                delete(ChatLikeRecord).where(ChatLikeRecord.chat_id.in_(chat_ids))
+            )
+            session.execute(delete(Chat).where(Chat.id.in_(chat_ids)))
+            session.commit()
+        MessageStorage.delete_messages_batch(chat_ids)
+        SearchManager.remove_chat(*chat_ids)
+        return len(chat_ids)
+
+    def delete_presets(self) -> int:
+        with Session(sqlalchemy_engine) as session:
+            preset_ids = session.exec(
+                select(Preset.id)
+                .where(Preset.owner_id == self.user_id)
+                .limit(config.user_deletion_batch_size)
+            ).all()
+            if not preset_ids:
+                return 0
+            session.execute(
+                delete(PresetLikeRecord).where(
+                    PresetLikeRecord.preset_id.in_(preset_ids)
+                )
+            )
+            session.execute(delete(Preset).where(Preset.id.in_(preset_ids)))
+            session.commit()
+        MessageStorage.delete_messages_batch(preset_ids)
+        LikeManager.remove_trending(*preset_ids)
+        SearchManager.remove_preset(*preset_ids)
+        for preset_id in preset_ids:
+            PresetParametersCache.invalidate(preset_id)
+        PresetCatalog.invalidate()
+        return len(preset_ids)
+
+    def delete_credit_records(self) -> int:
+        with Session(sqlalchemy_engine) as session:
+            record_ids = session.exec(
+                select(CreditRecord.id)
+                .where(CreditRecord.user_id == self.user_id)
+                .limit(config.user_deletion_batch_size)
+            ).all()
+            if not record_ids:
+                return 0
+            session.execute(delete(CreditRecord).where(CreditRecord.id.in_(record_ids)))
+            session.commit()
+        return len(record_ids)
+
+    def delete_user(self) -> None:
+        with Session(sqlalchemy_engine) as session:
+            session.execute(delete(User).where(User.id == self.user_id))
+            session.commit()
+        redis_client.hdel("credits", self.user_id)
+        UserCache.invalidate(self.user_id)
+        return None
+
+    async def generate(self, user_id: int):
+        self.user_id = user_id
+        await self.on_status(TaskStatus.running)
+
+        try:
+            total = await asyncio.to_thread(self.count_rows)
+            deleted = 0
+            for delete_batch in (
+                self.delete_preset_likes,
+                self.delete_chat_likes,
+                self.delete_chats,
+                self.delete_presets,
+                self.delete_credit_records,
+            ):
+                while count := await asyncio.to_thread(delete_batch):
+                    deleted += count
+                    TaskManager.set_progress(self.task_id, min(deleted / total, 1))
+            await asyncio.to_thread(self.delete_user)
+        except Exception as e:
+            logger.error(f"Failed to delete user {user_id}: {e}")
+            await self.on_status(TaskStatus.failed)
+            raise e
+
+        TaskManager.set_progress(self.task_id, 1)
+        await self.on_status(TaskStatus.finished)
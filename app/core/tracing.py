@@ -0,0 +1,79 @@
+from app.core.log import logger
+from app.models.task import TaskSpan, TaskTrace
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+import time
+
+
+class TaskTracer:
+    """
+    Record the stages of a background task as spans, timed from the moment the
+    task was enqueued. The trace is stored with the task once it ends and can
+    also be sent to OpenTelemetry.
+    """
+
+    def __init__(self, task_id: str, task_type: str):
+        self.task_id = task_id
+        self.task_type = task_type
+        self.start_time = time.time()
+        self.spans: list[TaskSpan] = []
+
+    def add_span(self, name: str, start: float, end: Optional[float] = None) -> None:
+        """
+        Add a span between two `time.time()` timestamps, ending now by default.
+        """
+        if end is None:
+            end = time.time()
+        self.spans.append(
+            TaskSpan(
+                name=name,
+                start=start - self.start_time,
+                duration=max(end - start, 0),
+            )
+        )
+        return None
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_span(name, start)
+
+    def get_trace(self) -> TaskTrace:
+        return TaskTrace(
+            task_id=self.task_id,
+            type=self.task_type,
+            start_time=datetime.fromtimestamp(self.start_time, timezone.utc),
+            duration=time.time() - self.start_time,
+            spans=self.spans,
+        )
+
+    def export(self, trace: TaskTrace) -> None:
+        """
+        Send the trace through the OpenTelemetry API. Spans only leave the
+        process if an SDK with an exporter is configured, e.g. by running the
+        server under `opentelemetry-instrument`.
+        """
+        try:
+            from opentelemetry import trace as otel_trace
+        except ImportError:
+            logger.warning("opentelemetry-api is not installed, skipping trace export")
+            return None
+
+        tracer = otel_trace.get_tracer("app.core.tasks")
+        root = tracer.start_span(
+            trace.type,
+            start_time=int(self.start_time * 1e9),
+            attributes={"task.id": trace.task_id},
+        )
+        context = otel_trace.set_span_in_context(root)
+        for span in trace.spans:
+            start = self.start_time + span.start
+            tracer.start_span(
+                span.name, context=context, start_time=int(start * 1e9)
+            ).end(end_time=int((start + span.duration) * 1e9))
+        root.end(end_time=int((self.start_time + trace.duration) * 1e9))
+        return None
@@ -1,14 +1,53 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import config
 from app.core.managers.static import StaticFilesManager
+from app.core.managers.ledger import CreditLedger
+from app.core.managers.credit import CreditManager
+from app.core.connections.replica import ReplicaRouter, replica_engines
+from app.core.clients.wechat import wechat_client_async
+from app.core.metrics import init_metrics, mark_process_dead
+from app.core.profiler import init_profiler
 
 from app.core.log import log
+import asyncio
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ledger_task = asyncio.create_task(CreditLedger.run_forever())
+    compaction_task = asyncio.create_task(CreditLedger.run_compaction_forever())
+    reaper_task = asyncio.create_task(CreditManager.run_reaper_forever())
+    replica_task = (
+        asyncio.create_task(ReplicaRouter.run_forever()) if replica_engines else None
+    )
+    wechat_task = (
+        asyncio.create_task(wechat_client_async.run_forever())
+        if config.wechat_appid
+        else None
+    )
+    yield
+    ledger_task.cancel()
+    compaction_task.cancel()
+    reaper_task.cancel()
+    if replica_task is not None:
+        replica_task.cancel()
+    if wechat_task is not None:
+        wechat_task.cancel()
+    await wechat_client_async.close()
+    StaticFilesManager.shutdown()
+    mark_process_dead()
+    await asyncio.to_thread(CreditLedger.flush)
+    await log.complete()
+
 
 app = FastAPI(
-    title=config.project_name, openapi_url=f"{config.api_prefix}/openapi.json"
+    title=config.project_name,
+    openapi_url=f"{config.api_prefix}/openapi.json",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -17,10 +56,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(api_router, prefix=config.api_prefix)
 
+init_metrics(app)
+
+init_profiler(app)
+
 StaticFilesManager.init_static_files(app)
 
 log.init_config()
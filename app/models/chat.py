@@ -1,4 +1,4 @@
-from sqlmodel import SQLModel, Field, Relationship, func
+from sqlmodel import SQLModel, Field, Relationship, Index, func
 from typing import Optional, List
 from datetime import datetime
 from uuid import UUID, uuid4
@@ -30,6 +30,13 @@ class ChatBase(SQLModel):
 
 
 class Chat(ChatBase, table=True):
+    __table_args__ = (
+        Index("ix_chat_owner_id_create_time", "owner_id", "create_time"),
+        Index("ix_chat_owner_id_update_time", "owner_id", "update_time"),
+        Index("ix_chat_owner_id_title", "owner_id", "title"),
+        Index("ix_chat_owner_id_like_count", "owner_id", "like_count"),
+    )
+
     id: Optional[UUID] = Field(default_factory=uuid4, primary_key=True)
     owner_id: int = Field(
         title="Owner ID", description="Owner's unique identifier", foreign_key="user.id"
@@ -39,6 +46,12 @@ class Chat(ChatBase, table=True):
     like_records: List["ChatLikeRecord"] = Relationship(
         back_populates="chat", sa_relationship_kwargs={"cascade": "all, delete-orphan"}
     )
+    like_count: int = Field(
+        default=0,
+        title="Like count",
+        description="The number of likes of the chat",
+        sa_column_kwargs={"server_default": "0"},
+    )
     create_time: datetime = Field(default_factory=datetime.now)
     update_time: datetime = Field(
         default_factory=datetime.now, sa_column_kwargs={"onupdate": func.now()}
@@ -53,6 +66,9 @@ class ChatRead(ChatBase):
     id: UUID = Field(title="Chat ID", description="Chat's unique identifier")
     owner_id: int = Field(title="Owner ID", description="Owner's unique identifier")
     messages: "Messages" = Field(title="Messages", description="Messages in the chat")
+    like_count: int = Field(
+        default=0, title="Like count", description="The number of likes of the chat"
+    )
     create_time: datetime = Field(
         title="Create time", description="The time when the chat is created"
     )
@@ -61,8 +77,18 @@ class ChatRead(ChatBase):
     )
 
 
+class ChatImage(SQLModel):
+    url: str = Field(title="Image URL", description="The URL of the stored image")
+    preview_url: str = Field(
+        title="Preview URL", description="The URL of the compressed preview"
+    )
+    message: "Message" = Field(
+        title="Message", description="The image message added to the chat"
+    )
+
+
 # Import Models
-from .message import Messages
+from .message import Messages, Message
 from .user import User
 from .preset import Preset
 from .like import ChatLikeRecord
@@ -71,3 +97,4 @@ from .like import ChatLikeRecord
 Chat.model_rebuild()
 ChatCreate.model_rebuild()
 ChatRead.model_rebuild()
+ChatImage.model_rebuild()
@@ -1,4 +1,4 @@
-from sqlmodel import SQLModel, Field, Relationship
+from sqlmodel import SQLModel, Field, Relationship, Index
 from typing import Optional, List
 from datetime import datetime
 
@@ -23,10 +23,23 @@ class CreditRecordBase(SQLModel):
 
 
 class CreditRecord(CreditRecordBase, table=True):
+    __table_args__ = (
+        Index("ix_creditrecord_user_id_create_time", "user_id", "create_time"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # Id of the ledger entry the record was flushed from, so a replayed entry is
+    # never written twice
+    ledger_id: Optional[str] = Field(
+        default=None, max_length=32, unique=True, index=True
+    )
     user: "User" = Relationship(back_populates="credit_records")
 
 
+class CreditLedgerEntry(CreditRecordBase):
+    ledger_id: Optional[str] = None
+
+
 class CreditRecordRead(CreditRecordBase):
     id: int = Field(
         title="Credit record ID", description="Credit record's unique identifier"
@@ -41,6 +54,22 @@ class CreditRecords(SQLModel):
         title="Credits left",
         description="The amount of credits left",
     )
+    next_cursor: Optional[str] = Field(
+        default=None,
+        title="Next cursor",
+        description="The cursor of the next page, null if there are no more records",
+    )
+
+
+class CreditLedgerStatus(SQLModel):
+    pending: int = Field(
+        title="Pending records",
+        description="The number of credit records waiting to be written",
+    )
+    lag: float = Field(
+        title="Ledger lag",
+        description="The age of the oldest pending credit record in seconds",
+    )
 
 
 class RedeemCredit(SQLModel):
@@ -60,6 +89,89 @@ class RedeemCode(SQLModel):
         description="The value of the redeem code",
         gt=0,
     )
+    expire_seconds: Optional[int] = Field(
+        default=None,
+        title="Expire seconds",
+        description="Seconds until the redeem code expires, null for never",
+        gt=0,
+    )
+
+
+class RedeemCodeBatchCreate(SQLModel):
+    count: int = Field(
+        title="Code count",
+        description="The number of redeem codes to generate",
+        gt=0,
+        le=100000,
+    )
+    length: int = Field(
+        default=16,
+        title="Code length",
+        description="The length of each generated redeem code",
+        ge=8,
+        le=32,
+    )
+    value: int = Field(
+        title="Redeem value",
+        description="The value of each redeem code",
+        gt=0,
+    )
+    expire_seconds: Optional[int] = Field(
+        default=None,
+        title="Expire seconds",
+        description="Seconds until the redeem codes expire, null for never",
+        gt=0,
+    )
+
+
+class RedeemCodeBatchImport(SQLModel):
+    redeem_codes: List[str] = Field(
+        title="Redeem codes",
+        description="The redeem codes to import",
+        min_length=1,
+        max_length=100000,
+    )
+    value: int = Field(
+        title="Redeem value",
+        description="The value of each redeem code",
+        gt=0,
+    )
+    expire_seconds: Optional[int] = Field(
+        default=None,
+        title="Expire seconds",
+        description="Seconds until the redeem codes expire, null for never",
+        gt=0,
+    )
+
+
+class RedeemCodeBatch(SQLModel):
+    batch_id: str = Field(
+        title="Batch ID", description="Redeem code batch's unique identifier"
+    )
+    value: int = Field(
+        title="Redeem value", description="The value of each redeem code in the batch"
+    )
+    count: int = Field(
+        title="Code count", description="The number of redeem codes in the batch"
+    )
+    redeemed: int = Field(
+        title="Redeemed count",
+        description="The number of redeem codes already redeemed",
+    )
+    create_time: datetime = Field(
+        title="Create time", description="The time when the batch is created"
+    )
+    expire_time: Optional[datetime] = Field(
+        default=None,
+        title="Expire time",
+        description="The time when the redeem codes expire, null for never",
+    )
+
+
+class RedeemCodeBatchRead(RedeemCodeBatch):
+    redeem_codes: List[str] = Field(
+        title="Redeem codes", description="The redeem codes in the batch"
+    )
 
 
 # Import Models
@@ -6,6 +6,7 @@ class OrderBy(Enum):
     TITLE = "title"
     CREATE_TIME = "create_time"
     UPDATE_TIME = "update_time"
+    LIKES = "like_count"
 
 
 class Order(Enum):
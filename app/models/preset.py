@@ -1,4 +1,4 @@
-from sqlmodel import SQLModel, Field, Relationship, func
+from sqlmodel import SQLModel, Field, Relationship, Index, JSON, func
 from typing import Optional, List
 from datetime import datetime
 from uuid import UUID, uuid4
@@ -143,13 +143,27 @@ class PresetBase(SQLModel):
 
 
 class Preset(PresetBase, table=True):
+    __table_args__ = (
+        Index("ix_preset_owner_id_create_time", "owner_id", "create_time"),
+        Index("ix_preset_owner_id_update_time", "owner_id", "update_time"),
+        Index("ix_preset_owner_id_title", "owner_id", "title"),
+        Index("ix_preset_owner_id_like_count", "owner_id", "like_count"),
+        Index("ix_preset_visibility_create_time", "visibility", "create_time"),
+        Index("ix_preset_visibility_update_time", "visibility", "update_time"),
+        Index("ix_preset_visibility_title", "visibility", "title"),
+        Index("ix_preset_visibility_like_count", "visibility", "like_count"),
+    )
+
     id: Optional[UUID] = Field(default_factory=uuid4, primary_key=True)
     owner_id: int = Field(
         title="Owner ID", description="Owner's unique identifier", foreign_key="user.id"
     )
     owner: "User" = Relationship(back_populates="presets")
-    parameters: Optional[str] = Field(
-        default=None, title="Preset parameters", description="Parameters of the preset"
+    parameters: Optional[dict] = Field(
+        default=None,
+        sa_type=JSON,
+        title="Preset parameters",
+        description="Parameters of the preset",
     )
     like_records: List["PresetLikeRecord"] = Relationship(
         back_populates="preset",
@@ -159,6 +173,12 @@ class Preset(PresetBase, table=True):
         back_populates="preset",
         sa_relationship_kwargs={"cascade": "all, delete-orphan"},
     )
+    like_count: int = Field(
+        default=0,
+        title="Like count",
+        description="The number of likes of the preset",
+        sa_column_kwargs={"server_default": "0"},
+    )
     create_time: datetime = Field(default_factory=datetime.now)
     update_time: datetime = Field(
         default_factory=datetime.now, sa_column_kwargs={"onupdate": func.now()}
@@ -179,6 +199,9 @@ class PresetRead(PresetBase):
     parameters: Optional[PresetParameters] = Field(
         default=None, title="Preset parameters", description="Parameters of the preset"
     )
+    like_count: int = Field(
+        default=0, title="Like count", description="The number of likes of the preset"
+    )
     create_time: datetime = Field(
         title="Create time", description="The time when the preset is created"
     )
@@ -1,4 +1,6 @@
 from sqlmodel import SQLModel, Field
+from typing import Optional
+from datetime import datetime
 
 
 class ServerMessage(SQLModel):
@@ -7,3 +9,72 @@ class ServerMessage(SQLModel):
 
 class ExceptionDetail(SQLModel):
     detail: str | dict | None = Field(default=None)
+
+
+class PoolStatus(SQLModel):
+    size: int = Field(
+        title="Pool size", description="Configured number of pooled connections"
+    )
+    checked_in: int = Field(
+        title="Checked in", description="Idle connections in the pool"
+    )
+    checked_out: int = Field(
+        title="Checked out", description="Connections currently in use"
+    )
+    overflow: int = Field(
+        title="Overflow", description="Connections opened beyond the pool size"
+    )
+    max_overflow: int = Field(
+        title="Max overflow", description="Maximum overflow connections"
+    )
+    checkouts: int = Field(title="Checkouts", description="Total number of checkouts")
+    timeouts: int = Field(
+        title="Timeouts", description="Checkouts that timed out waiting"
+    )
+    wait_avg: float = Field(
+        title="Average wait", description="Average checkout wait in seconds"
+    )
+    wait_max: float = Field(
+        title="Max wait", description="Longest checkout wait in seconds"
+    )
+
+
+class PasswordHasherStatus(SQLModel):
+    workers: int = Field(title="Workers", description="Threads hashing passwords")
+    max_queue: int = Field(
+        title="Max queue", description="Jobs allowed to wait before rejecting"
+    )
+    queued: int = Field(title="Queued", description="Jobs waiting for a thread")
+    running: int = Field(title="Running", description="Jobs being hashed")
+    completed: int = Field(title="Completed", description="Total number of jobs")
+    rejected: int = Field(
+        title="Rejected", description="Jobs rejected because the queue was full"
+    )
+    wait_avg: float = Field(
+        title="Average wait", description="Average queue wait in seconds"
+    )
+    wait_max: float = Field(
+        title="Max wait", description="Longest queue wait in seconds"
+    )
+
+
+class ReplicaStatus(SQLModel):
+    url: str = Field(title="URL", description="Replica URL without the password")
+    healthy: bool = Field(
+        title="Healthy", description="Whether reads are routed to the replica"
+    )
+    lag: Optional[float] = Field(
+        default=None,
+        title="Lag",
+        description="Replication lag in seconds, empty if the replica is unreachable",
+    )
+
+
+class RequestProfile(SQLModel):
+    profile_id: str = Field(title="Profile ID")
+    method: str = Field(title="Method", description="HTTP method of the request")
+    path: str = Field(title="Path", description="Path of the request")
+    duration: float = Field(
+        title="Duration", description="Time spent handling the request in seconds"
+    )
+    create_time: datetime = Field(title="Create time")
@@ -1,5 +1,6 @@
 from sqlmodel import SQLModel, Field
 from typing import Optional
+from datetime import datetime
 from enum import Enum
 
 
@@ -19,6 +20,7 @@ class TaskType(str, Enum):
 class Task(SQLModel):
     task_id: str
     status: TaskStatus = Field(default=TaskStatus.pending)
+    progress: Optional[float] = Field(default=None, ge=0, le=1)
 
 
 class TaskCreate(SQLModel):
@@ -33,3 +35,17 @@ class TaskStream(SQLModel):
 
 class TaskFinish(TaskStream):
     token_cost: int
+
+
+class TaskSpan(SQLModel):
+    name: str
+    start: float
+    duration: float
+
+
+class TaskTrace(SQLModel):
+    task_id: str
+    type: str
+    start_time: datetime
+    duration: float
+    spans: list[TaskSpan] = Field(default_factory=list)
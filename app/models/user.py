@@ -1,5 +1,12 @@
 from sqlmodel import SQLModel, Field, Relationship
 from typing import Optional, List
+from enum import Enum
+
+
+class AvatarSize(int, Enum):
+    small = 32
+    medium = 64
+    large = 128
 
 
 class UserBase(SQLModel):
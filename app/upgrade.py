@@ -0,0 +1,9 @@
+from app.core.connections.sql import upgrade_db
+from app.core.managers.like import LikeManager
+from app.core.managers.search import SearchManager
+
+
+if __name__ == "__main__":
+    upgrade_db()
+    LikeManager.rebuild_like_counts()
+    SearchManager.rebuild_index()